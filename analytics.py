@@ -0,0 +1,176 @@
+"""
+Clinic analytics
+Each metric is one GROUP BY over a clinic's date range (monthly revenue
+reads the daily_clinic_stats rollup, so multi-year ranges stay small).
+Results are cached per worker for (clinic, metric, range). A commit that
+touches a clinic's consultations or prescriptions drops that clinic's
+entries, and a TTL covers writes made by other workers.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, time as clock, timedelta
+from sqlalchemy import event
+from models import db, Consultation, Prescription, Medicine, DailyClinicStats
+
+TOP_N = 20
+
+
+def _month(column):
+    """'YYYY-MM' for a date/datetime column"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return db.func.to_char(column, 'YYYY-MM')
+    return db.func.strftime('%Y-%m', column)
+
+
+def _between(column, start, end):
+    """Inclusive date range on a datetime column"""
+    return db.and_(column >= datetime.combine(start, clock.min),
+                   column < datetime.combine(end + timedelta(days=1), clock.min))
+
+
+def revenue(clinic_id, start, end):
+    """Consultations and billed amount per month"""
+    month = _month(DailyClinicStats.stat_date)
+    rows = db.session.query(
+        month, db.func.sum(DailyClinicStats.consultations), db.func.sum(DailyClinicStats.collection)
+    ).filter(
+        DailyClinicStats.clinic_id == clinic_id,
+        DailyClinicStats.stat_date >= start,
+        DailyClinicStats.stat_date <= end
+    ).group_by(month).order_by(month)
+    return [{'month': m, 'consultations': int(count or 0), 'billed': float(total or 0)} for m, count, total in rows]
+
+
+def payments(clinic_id, start, end):
+    """Consultations and amount by payment status and method"""
+    method = db.func.coalesce(Consultation.payment_method, 'unknown')
+    rows = db.session.query(
+        Consultation.payment_status, method, db.func.count(Consultation.id), db.func.sum(Consultation.total_amount)
+    ).filter(
+        Consultation.clinic_id == clinic_id, _between(Consultation.consultation_date, start, end)
+    ).group_by(Consultation.payment_status, method).order_by(db.func.sum(Consultation.total_amount).desc())
+    return [{'status': status or 'unpaid', 'method': m, 'consultations': count, 'amount': float(total or 0)}
+            for status, m, count, total in rows]
+
+
+def diagnoses(clinic_id, start, end):
+    """Most frequent diagnoses from consultations and stand-alone prescriptions"""
+    consult = db.select(Consultation.diagnosis.label('diagnosis')).where(
+        Consultation.clinic_id == clinic_id, _between(Consultation.consultation_date, start, end)
+    )
+    # Prescriptions written during a consultation repeat its diagnosis
+    standalone = db.select(Prescription.diagnosis.label('diagnosis')).where(
+        Prescription.clinic_id == clinic_id, Prescription.consultation_id.is_(None),
+        _between(Prescription.created_at, start, end)
+    )
+    union = db.union_all(consult, standalone).subquery()
+    key = db.func.lower(db.func.trim(union.c.diagnosis))
+    rows = db.session.execute(
+        db.select(db.func.max(db.func.trim(union.c.diagnosis)), db.func.count())
+        .where(union.c.diagnosis.isnot(None), db.func.trim(union.c.diagnosis) != '')
+        .group_by(key).order_by(db.func.count().desc(), key).limit(TOP_N)
+    )
+    return [{'diagnosis': name, 'count': count} for name, count in rows]
+
+
+def medicines(clinic_id, start, end):
+    """Most prescribed medicines (prescription lines and distinct patients)"""
+    rows = db.session.query(
+        Medicine.name, db.func.count(Medicine.id), db.func.count(db.distinct(Prescription.patient_id))
+    ).join(Prescription, Prescription.id == Medicine.prescription_id).filter(
+        Prescription.clinic_id == clinic_id, _between(Prescription.created_at, start, end)
+    ).group_by(Medicine.name).order_by(db.func.count(Medicine.id).desc(), Medicine.name).limit(TOP_N)
+    return [{'name': name, 'prescriptions': count, 'patients': patients} for name, count, patients in rows]
+
+
+def referrals(clinic_id, start, end):
+    """Referrals per specialist"""
+    target = db.func.trim(Prescription.referral_to)
+    rows = db.session.query(target, db.func.count(Prescription.id)).filter(
+        Prescription.clinic_id == clinic_id, _between(Prescription.created_at, start, end),
+        Prescription.referral_to.isnot(None), target != ''
+    ).group_by(target).order_by(db.func.count(Prescription.id).desc(), target).limit(TOP_N)
+    return [{'referral_to': name, 'count': count} for name, count in rows]
+
+
+METRICS = {
+    'revenue': revenue,
+    'payments': payments,
+    'diagnoses': diagnoses,
+    'medicines': medicines,
+    'referrals': referrals,
+}
+
+
+class AnalyticsCache:
+    """
+    Thread-safe LRU of metric results. Each clinic has a generation number
+    that is part of the key, so invalidating a clinic is one increment and
+    its stale entries age out of the LRU.
+    """
+
+    def __init__(self):
+        self._results = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, ttl):
+        with self._lock:
+            key = key + (self._generations.get(key[0], 0),)
+            hit = self._results.get(key)
+            if hit is None or time.monotonic() - hit[0] > ttl:
+                return None
+            self._results.move_to_end(key)
+            return hit[1]
+
+    def put(self, key, value, max_entries):
+        with self._lock:
+            key = key + (self._generations.get(key[0], 0),)
+            self._results[key] = (time.monotonic(), value)
+            self._results.move_to_end(key)
+            while len(self._results) > max_entries:
+                self._results.popitem(last=False)
+
+    def invalidate(self, clinic_id):
+        with self._lock:
+            self._generations[clinic_id] = self._generations.get(clinic_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+analytics_cache = AnalyticsCache()
+
+
+def compute(clinic_id, metric, start, end, ttl=300, max_entries=500):
+    """Cached result of one metric over [start, end] (dates, inclusive)"""
+    key = (clinic_id, metric, start, end)
+    result = analytics_cache.get(key, ttl) if ttl else None
+    if result is None:
+        result = METRICS[metric](clinic_id, start, end)
+        if ttl:
+            analytics_cache.put(key, result, max_entries)
+    return result
+
+
+def init_analytics(app):
+    """Invalidate a clinic's cached results when its consultations or prescriptions are committed"""
+
+    @event.listens_for(db.session, 'after_flush')
+    def collect_changes(session, flush_context):
+        changed = session.info.setdefault('analytics_clinics', set())
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, (Consultation, Prescription)):
+                changed.add(obj.clinic_id)
+
+    @event.listens_for(db.session, 'after_commit')
+    def invalidate_changed(session):
+        for clinic_id in session.info.pop('analytics_clinics', ()):
+            analytics_cache.invalidate(clinic_id)
+
+    @event.listens_for(db.session, 'after_soft_rollback')
+    def forget_changes(session, previous_transaction):
+        if not session.in_transaction():
+            session.info.pop('analytics_clinics', None)
@@ -2,10 +2,31 @@
 Clinic Management System - Simple Prototype
 A basic healthcare management system for small clinics
 """
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from models import db, Clinic, Patient, Appointment, Consultation, Prescription, Medicine, MedicineMaster, DiagnosticTestMaster
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
+from models import db, Clinic, Patient, Appointment, Consultation, Prescription, Medicine, MedicineMaster, MedicineDosingStat, DiagnosticTestMaster, DailyClinicStats, SchemaVersion, SCHEMA_VERSION, usage_score, diagnostic_test_names
+from autocomplete import AutocompleteIndex
+from query_budget import query_budget
+from pagination import keyset_paginate, get_per_page
+from patient_search import patient_search, setup_patient_search
+from metrics import init_metrics
+from db_profiles import default_profile, engine_options, install_engine_hooks
+from db_replica import REPLICA_BIND, init_replica
+from patient_import import import_patients
+from data_export import DATASETS, FORMATS, chunk_bounds, export_chunks
+from http_cache import conditional_page, page_etag
+from patient_timeline import timeline_page
+from slots import MAX_DAYS, SlotUnavailable, available_slots, book_slot
+from jobs import init_jobs
+from reminders import schedule_appointment, schedule_follow_up, enqueue_upcoming
+from analytics import METRICS, compute, init_analytics
 from datetime import datetime, date, timedelta
+import csv
+import io
+import json
 import os
+import threading
+import click
+from sqlalchemy.schema import CreateIndex
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -22,21 +43,200 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Optional read replica: GET requests read from it, writes and the requests
+# right after them use the primary (see db_replica.py)
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+if DATABASE_REPLICA_URL:
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: DATABASE_REPLICA_URL}
+# How long a browser/clinic keeps reading from the primary after a write (cover replication lag)
+app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+# Connection pool profile: serverless, worker or sqlite-local (see db_profiles.py)
+app.config['DB_POOL_PROFILE'] = os.environ.get('DB_POOL_PROFILE') or default_profile(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['DB_POOL_PROFILE'], app.config['SQLALCHEMY_DATABASE_URI'])
+
+# Fail requests that exceed their declared query budget (always on when TESTING)
+app.config['QUERY_BUDGET_ENFORCE'] = os.environ.get('QUERY_BUDGET_ENFORCE') == '1'
+
+# Instrumentation: /metrics (Prometheus), optional Server-Timing header
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['METRICS_SERVER_TIMING'] = os.environ.get('METRICS_SERVER_TIMING') == '1'
+
+# Bulk patient import: rows per INSERT batch (IDs are allocated per batch too)
+app.config['PATIENT_IMPORT_BATCH_SIZE'] = int(os.environ.get('PATIENT_IMPORT_BATCH_SIZE', 500))
+
+# Data export: max records per response (0 = whole export in one response).
+# Larger exports are split into chunks linked by the `Link: rel="next"` header.
+app.config['EXPORT_MAX_ROWS'] = int(os.environ.get('EXPORT_MAX_ROWS', 20000 if os.environ.get('VERCEL') else 0))
+
+# Rendered prescription/consultation pages kept per worker (0 disables)
+app.config['RENDER_CACHE_SIZE'] = int(os.environ.get('RENDER_CACHE_SIZE', 200))
+
+# Background jobs: cron endpoint token and time limit per call (see jobs.py)
+app.config['JOBS_TOKEN'] = os.environ.get('JOBS_TOKEN')
+app.config['JOBS_RUN_SECONDS'] = int(os.environ.get('JOBS_RUN_SECONDS', 20))
+
+# SMS reminders: provider class, and when to send (clinic local time, the day before)
+app.config['SMS_PROVIDER'] = os.environ.get('SMS_PROVIDER', 'reminders:StubSMSProvider')
+app.config['REMINDER_SEND_AT'] = os.environ.get('REMINDER_SEND_AT', '10:00')
+app.config['REMINDER_TZ_OFFSET_MINUTES'] = int(os.environ.get('REMINDER_TZ_OFFSET_MINUTES', 330))
+
+# Analytics results cached per worker; writes invalidate their clinic (0 disables)
+app.config['ANALYTICS_CACHE_TTL'] = int(os.environ.get('ANALYTICS_CACHE_TTL', 300))
+app.config['ANALYTICS_CACHE_SIZE'] = int(os.environ.get('ANALYTICS_CACHE_SIZE', 500))
+
+# Medicine autocomplete cache (per worker process)
+app.config['AUTOCOMPLETE_MAX_CLINICS'] = int(os.environ.get('AUTOCOMPLETE_MAX_CLINICS', 200))
+app.config['AUTOCOMPLETE_MAX_ENTRIES'] = int(os.environ.get('AUTOCOMPLETE_MAX_ENTRIES', 5000))
+app.config['AUTOCOMPLETE_TTL_SECONDS'] = int(os.environ.get('AUTOCOMPLETE_TTL_SECONDS', 300))
+# Time allowed for typo-tolerant matching per search (0 disables it)
+app.config['AUTOCOMPLETE_FUZZY_BUDGET_MS'] = float(os.environ.get('AUTOCOMPLETE_FUZZY_BUDGET_MS', 10))
+
 # Initialize database
 db.init_app(app)
-
-# Create tables (for serverless compatibility)
-def init_db():
-    """Initialize database tables if they don't exist"""
+with app.app_context():
+    for engine in db.engines.values():
+        install_engine_hooks(engine, app.config['DB_POOL_PROFILE'])
+init_replica(app)
+init_metrics(app)
+init_jobs(app)
+init_analytics(app)
+
+# Schema check: 'auto' checks the stored schema version once per process, on
+# the first request (not at import, so cold starts don't pay for it);
+# 'skip' assumes migrations were applied and never touches the schema
+app.config['SCHEMA_CHECK'] = os.environ.get('SCHEMA_CHECK', 'auto')
+
+
+def init_db(force=False):
+    """Create missing tables/indexes if the stored schema version is behind"""
     with app.app_context():
         try:
+            if not force:
+                try:
+                    current = db.session.execute(db.select(SchemaVersion.version)).scalar()
+                except Exception:
+                    db.session.rollback()  # No schema_version table yet
+                    current = None
+                if current == SCHEMA_VERSION:
+                    return
+            
             db.create_all()
-            print("✅ Database tables initialized")
+            # create_all() skips tables that already exist, so add any
+            # indexes declared since those tables were created (IF NOT EXISTS:
+            # reflection can't see expression indexes, so checkfirst would miss them)
+            with db.engine.begin() as conn:
+                for table in db.metadata.sorted_tables:
+                    for index in table.indexes:
+                        conn.execute(CreateIndex(index, if_not_exists=True))
+            setup_patient_search()
+            SchemaVersion.mark(SCHEMA_VERSION)
+            db.session.commit()
+            print(f"✅ Database tables initialized (schema v{SCHEMA_VERSION})")
         except Exception as e:
+            db.session.rollback()
             print(f"⚠️ Database initialization error: {e}")
 
-# Initialize database on first import
-init_db()
+
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+
+@app.before_request
+def ensure_schema():
+    """Run the schema check once per process, before the first request"""
+    global _schema_checked
+    if _schema_checked or app.config['SCHEMA_CHECK'] == 'skip':
+        return
+    with _schema_lock:
+        if not _schema_checked:
+            init_db()
+            _schema_checked = True
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create tables, search indexes and the schema version marker"""
+    init_db(force=True)
+
+
+@app.cli.command('rebuild-daily-stats')
+@click.option('--clinic-id', type=int, help='Only rebuild this clinic')
+def rebuild_daily_stats(clinic_id):
+    """Rebuild the daily_clinic_stats rollup from consultation/patient history"""
+    rows = DailyClinicStats.rebuild(clinic_id)
+    db.session.commit()
+    print(f"✅ Rebuilt daily stats ({rows} rows)")
+
+
+@app.cli.command('rebuild-library-scores')
+@click.option('--clinic-id', type=int, help='Only rebuild this clinic')
+def rebuild_library_scores_command(clinic_id):
+    """Recompute medicine/test autocomplete scores from prescription history"""
+    rows = MedicineMaster.rebuild_scores(clinic_id) + DiagnosticTestMaster.rebuild_scores(clinic_id)
+    db.session.commit()
+    print(f"✅ Rebuilt library scores ({rows} rows)")
+
+
+@app.cli.command('rebuild-dosing-stats')
+@click.option('--clinic-id', type=int, help='Only rebuild this clinic')
+def rebuild_dosing_stats(clinic_id):
+    """Recount medicine dosing values from prescription history and refresh library defaults"""
+    rows = MedicineDosingStat.rebuild(clinic_id)
+    db.session.commit()
+    print(f"✅ Rebuilt dosing stats ({rows} rows)")
+
+
+@app.cli.command('rebuild-patient-counters')
+@click.option('--clinic-id', type=int, help='Only rebuild this clinic')
+def rebuild_patient_counters(clinic_id):
+    """Recount each patient's visits and prescriptions"""
+    rows = Patient.rebuild_counters(clinic_id)
+    db.session.commit()
+    print(f"✅ Rebuilt counters for {rows} patients")
+
+
+@app.cli.command('import-patients')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--clinic-id', type=int, required=True, help='Clinic to import into')
+@click.option('--batch-size', type=int, help='Rows per insert batch')
+def import_patients_command(csv_file, clinic_id, batch_size):
+    """Bulk import patients from a CSV file (name and phone columns required)"""
+    if not db.session.get(Clinic, clinic_id):
+        raise click.ClickException(f'No clinic with id {clinic_id}')
+    try:
+        result = import_patients(clinic_id, csv_file, batch_size or app.config['PATIENT_IMPORT_BATCH_SIZE'])
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for line, message in result.errors:
+        print(f"⚠️ Line {line}: {message}")
+    if result.failed > len(result.errors):
+        print(f"⚠️ ...and {result.failed - len(result.errors)} more errors")
+    print(f"✅ Imported {result.imported} patients in {result.batches} batches ({result.failed} rows skipped)")
+
+
+@app.cli.command('export')
+@click.argument('dataset', type=click.Choice(sorted(DATASETS)))
+@click.option('--clinic-id', type=int, required=True, help='Clinic to export')
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default='csv')
+@click.option('--from', 'start', type=click.DateTime(['%Y-%m-%d']), help='First date (inclusive)')
+@click.option('--to', 'end', type=click.DateTime(['%Y-%m-%d']), help='Last date (inclusive)')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-')
+def export_command(dataset, clinic_id, fmt, start, end, output):
+    """Export patients, consultations or prescriptions as CSV/NDJSON"""
+    for chunk in export_chunks(dataset, fmt, clinic_id,
+                               start=start.date() if start else None, end=end.date() if end else None):
+        output.write(chunk)
+
+
+@app.cli.command('enqueue-reminders')
+@click.option('--clinic-id', type=int, help='Only this clinic')
+def enqueue_reminders_command(clinic_id):
+    """Queue SMS reminders for upcoming appointments and follow-ups (safe to re-run)"""
+    seen = enqueue_upcoming(clinic_id)
+    db.session.commit()
+    print(f"✅ Checked {seen} upcoming appointments/follow-ups for reminders")
+
 
 # Login required decorator
 def login_required(f):
@@ -213,32 +413,121 @@ def settings():
         raise
 
 
+# ==================== DATA EXPORT ====================
+
+def parse_export_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+@app.route('/export/<dataset>')
+@login_required
+def export_data(dataset):
+    """
+    Stream a full export as CSV or NDJSON (?format=ndjson).
+    Optional filters: from/to (YYYY-MM-DD, inclusive), after (last exported id), limit.
+    """
+    fmt = request.args.get('format', 'csv')
+    if dataset not in DATASETS or fmt not in FORMATS:
+        return jsonify({'error': 'Unknown export'}), 404
+    try:
+        start = parse_export_date(request.args.get('from'))
+        end = parse_export_date(request.args.get('to'))
+        after = request.args.get('after', type=int)
+        limit = request.args.get('limit', type=int)
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be a positive number'}), 400
+    limit = limit or app.config['EXPORT_MAX_ROWS']
+    if app.config['EXPORT_MAX_ROWS']:
+        limit = min(limit, app.config['EXPORT_MAX_ROWS'])
+    
+    clinic_id = session['clinic_id']
+    last_id, has_more = chunk_bounds(dataset, clinic_id, start, end, after, limit)
+    chunks = export_chunks(dataset, fmt, clinic_id, start=start, end=end, after=after, last_id=last_id)
+    
+    filename = f"{dataset}-{date.today().isoformat()}{f'-after-{after}' if after else ''}.{fmt}"
+    response = Response(stream_with_context(chunks), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if has_more:
+        args = request.args.to_dict()
+        args.update(after=last_id)
+        response.headers['Link'] = f'<{url_for("export_data", dataset=dataset, _external=True, **args)}>; rel="next"'
+    return response
+
+
+# ==================== REPORTS ====================
+
+def analytics_range():
+    """(start, end) from ?from=&to= (YYYY-MM-DD, inclusive); defaults to the last 12 months"""
+    end = parse_export_date(request.args.get('to')) or date.today()
+    start = parse_export_date(request.args.get('from')) or (end.replace(day=1) - timedelta(days=335)).replace(day=1)
+    if start > end:
+        raise ValueError('from is after to')
+    return start, end
+
+
+def analytics_results(metrics, start, end):
+    clinic_id = session['clinic_id']
+    return {
+        metric: compute(clinic_id, metric, start, end,
+                        ttl=app.config['ANALYTICS_CACHE_TTL'], max_entries=app.config['ANALYTICS_CACHE_SIZE'])
+        for metric in metrics
+    }
+
+
+@app.route('/api/analytics')
+@app.route('/api/analytics/<metric>')
+@login_required
+def analytics_api(metric=None):
+    """Clinic analytics as JSON: one metric, or all of them. Optional from/to (YYYY-MM-DD)."""
+    if metric is not None and metric not in METRICS:
+        return jsonify({'error': 'Unknown metric', 'metrics': list(METRICS)}), 404
+    try:
+        start, end = analytics_range()
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD, from before to'}), 400
+    results = analytics_results([metric] if metric else METRICS, start, end)
+    return jsonify({'from': start.isoformat(), 'to': end.isoformat(), **results})
+
+
+@app.route('/reports')
+@login_required
+@query_budget(7)
+def reports():
+    """Revenue, payments, diagnoses, medicines and referrals over a date range"""
+    try:
+        start, end = analytics_range()
+    except ValueError:
+        flash('Invalid date range', 'error')
+        return redirect(url_for('reports'))
+    return render_template('reports.html', start=start, end=end, **analytics_results(METRICS, start, end))
+
+
 # ==================== DASHBOARD ====================
 
 @app.route('/dashboard')
 @login_required
+@query_budget(4)
 def dashboard():
     """Main dashboard"""
     clinic_id = session['clinic_id']
     today = date.today()
     
-    # Get today's appointments
+    # Get today's appointments (patient joined, consultation batch-loaded)
     today_appointments = Appointment.query.filter_by(
         clinic_id=clinic_id,
         appointment_date=today
+    ).options(
+        db.joinedload(Appointment.patient),
+        db.selectinload(Appointment.consultation)
     ).order_by(Appointment.appointment_time).all()
     
-    # Get statistics
-    total_patients = Patient.query.filter_by(clinic_id=clinic_id).count()
-    today_consultations = Consultation.query.filter_by(clinic_id=clinic_id).filter(
-        db.func.date(Consultation.consultation_date) == today
-    ).count()
-    
-    # Today's collection
-    today_collection = db.session.query(db.func.sum(Consultation.total_amount)).filter(
-        Consultation.clinic_id == clinic_id,
-        db.func.date(Consultation.consultation_date) == today
-    ).scalar() or 0
+    # Statistics from the daily rollup (latest row carries the patient total)
+    stats = DailyClinicStats.latest(clinic_id, today)
+    total_patients = stats.patients_total if stats else 0
+    today_consultations = stats.consultations if stats and stats.stat_date == today else 0
+    today_collection = stats.collection if stats and stats.stat_date == today else 0
     
     return render_template('dashboard.html',
                          appointments=today_appointments,
@@ -250,25 +539,68 @@ def dashboard():
 
 # ==================== PATIENT ROUTES ====================
 
+def patient_to_dict(patient):
+    """JSON payload for patient list rows"""
+    return {
+        'id': patient.id,
+        'patient_id': patient.patient_id,
+        'name': patient.name,
+        'age': patient.age,
+        'gender': patient.gender,
+        'phone': patient.phone,
+        'registration_date': patient.registration_date.isoformat() if patient.registration_date else None,
+        'last_visit': patient.last_visit.isoformat() if patient.last_visit else None
+    }
+
+
 @app.route('/patients')
 @login_required
 def patients():
-    """List all patients"""
+    """List all patients (cursor-paginated, newest or best match first; ?format=json for JSON)"""
     clinic_id = session['clinic_id']
-    search = request.args.get('search', '')
+    search = request.args.get('search', '').strip()
+    per_page = get_per_page(request.args.get('per_page'))
     
+    query = Patient.query.filter_by(clinic_id=clinic_id)
     if search:
-        patients = Patient.query.filter_by(clinic_id=clinic_id).filter(
-            (Patient.name.ilike(f'%{search}%')) | 
-            (Patient.phone.ilike(f'%{search}%')) |
-            (Patient.patient_id.ilike(f'%{search}%'))
-        ).order_by(Patient.registration_date.desc()).all()
+        # Indexed search, best matches first (exact phone/ID, name prefix, rest)
+        query, keys = patient_search().search(query, search)
     else:
-        patients = Patient.query.filter_by(clinic_id=clinic_id).order_by(
-            Patient.registration_date.desc()
-        ).limit(100).all()
+        keys = [Patient.registration_date, Patient.id]
+    
+    page = keyset_paginate(query, keys, per_page,
+                           after=request.args.get('after'), before=request.args.get('before'))
+    
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'patients': [patient_to_dict(p) for p in page.items],
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor
+        })
     
-    return render_template('patients/list.html', patients=patients, search=search)
+    return render_template('patients/list.html', patients=page.items, page=page,
+                           search=search, per_page=per_page)
+
+
+@app.route('/api/patients/search')
+@login_required
+@query_budget(1)
+def search_patients_api():
+    """Patient typeahead: top matches by name, phone or patient ID (?q=...&limit=10)"""
+    term = request.args.get('q', '').strip()
+    if not term:
+        return jsonify([])
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 20)
+    
+    matches = patient_search().typeahead(session['clinic_id'], term, limit)
+    return jsonify([{
+        'id': patient.id,
+        'patient_id': patient.patient_id,
+        'name': patient.name,
+        'phone': patient.phone,
+        'age': patient.age,
+        'gender': patient.gender
+    } for patient in matches])
 
 
 @app.route('/patients/add', methods=['GET', 'POST'])
@@ -277,65 +609,83 @@ def add_patient():
     """Add new patient"""
     if request.method == 'POST':
         clinic_id = session['clinic_id']
-        max_retries = 3
         
-        for attempt in range(max_retries):
-            try:
-                # Generate unique patient ID
-                patient_id = Patient.generate_patient_id(clinic_id)
-                
-                patient = Patient(
-                    clinic_id=clinic_id,
-                    patient_id=patient_id,
-                    name=request.form.get('name'),
-                    age=int(request.form.get('age')) if request.form.get('age') else None,
-                    gender=request.form.get('gender'),
-                    blood_group=request.form.get('blood_group'),
-                    phone=request.form.get('phone'),
-                    email=request.form.get('email'),
-                    address=request.form.get('address'),
-                    allergies=request.form.get('allergies'),
-                    chronic_conditions=request.form.get('chronic_conditions'),
-                    emergency_contact=request.form.get('emergency_contact'),
-                    emergency_phone=request.form.get('emergency_phone')
-                )
-                
-                db.session.add(patient)
-                db.session.commit()
-                
-                flash(f'✅ Patient {patient.name} registered successfully! (ID: {patient.patient_id})', 'success')
-                return redirect(url_for('view_patient', patient_id=patient.id))
-                
-            except Exception as e:
-                db.session.rollback()
-                error_msg = str(e)
-                
-                # Check if it's a duplicate key error
-                if 'unique constraint' in error_msg.lower() or 'duplicate' in error_msg.lower():
-                    if attempt < max_retries - 1:
-                        # Retry with a new ID
-                        continue
-                    else:
-                        flash('⚠️ Unable to generate unique patient ID. Please try again.', 'error')
-                else:
-                    # Other error - show and don't retry
-                    flash(f'❌ Error: {error_msg}', 'error')
-                    break
+        try:
+            # Allocate the next patient ID from the clinic's counter
+            patient_id = Patient.generate_patient_id(clinic_id)
+            
+            patient = Patient(
+                clinic_id=clinic_id,
+                patient_id=patient_id,
+                name=request.form.get('name'),
+                age=int(request.form.get('age')) if request.form.get('age') else None,
+                gender=request.form.get('gender'),
+                blood_group=request.form.get('blood_group'),
+                phone=request.form.get('phone'),
+                email=request.form.get('email'),
+                address=request.form.get('address'),
+                allergies=request.form.get('allergies'),
+                chronic_conditions=request.form.get('chronic_conditions'),
+                emergency_contact=request.form.get('emergency_contact'),
+                emergency_phone=request.form.get('emergency_phone')
+            )
+            
+            db.session.add(patient)
+            DailyClinicStats.record(clinic_id, datetime.utcnow().date(), new_patients=1)
+            db.session.commit()
+            
+            flash(f'✅ Patient {patient.name} registered successfully! (ID: {patient.patient_id})', 'success')
+            return redirect(url_for('view_patient', patient_id=patient.id))
+            
+        except Exception as e:
+            db.session.rollback()
+            flash(f'❌ Error: {str(e)}', 'error')
     
     return render_template('patients/add.html')
 
 
+@app.route('/patients/import', methods=['GET', 'POST'])
+@login_required
+def import_patients_csv():
+    """Bulk import patients from an uploaded CSV (?format=json for a JSON report)"""
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('❌ Please choose a CSV file', 'error')
+            return redirect(url_for('import_patients_csv'))
+        
+        # Werkzeug spools large uploads to disk; read it as a text stream
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        try:
+            result = import_patients(session['clinic_id'], stream, app.config['PATIENT_IMPORT_BATCH_SIZE'])
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            if request.args.get('format') == 'json':
+                return jsonify({'error': str(e)}), 400
+            flash(f'❌ Error: {str(e)}', 'error')
+            return redirect(url_for('import_patients_csv'))
+        
+        if request.args.get('format') == 'json':
+            return jsonify(result.to_dict())
+        flash(f'✅ Imported {result.imported} patients ({result.failed} rows skipped)',
+              'success' if not result.failed else 'error')
+    
+    return render_template('patients/import.html', result=result)
+
+
 @app.route('/patients/<int:patient_id>')
 @login_required
+@query_budget(3)
 def view_patient(patient_id):
-    """View patient details"""
+    """View patient details with the latest timeline entries (older ones load on demand)"""
     clinic_id = session['clinic_id']
     patient = Patient.query.filter_by(id=patient_id, clinic_id=clinic_id).first_or_404()
     
-    # Get consultation history
-    consultations = Consultation.query.filter_by(patient_id=patient_id).order_by(
-        Consultation.consultation_date.desc()
-    ).all()
+    # Latest consultations, prescriptions and appointments in one query
+    timeline, next_cursor = timeline_page(clinic_id, patient_id)
+    for entry in timeline:
+        add_timeline_links(entry)
     
     # Get upcoming appointments
     upcoming_appointments = Appointment.query.filter_by(
@@ -347,22 +697,55 @@ def view_patient(patient_id):
     
     return render_template('patients/view.html',
                          patient=patient,
-                         consultations=consultations,
+                         timeline=timeline,
+                         next_cursor=next_cursor,
                          upcoming_appointments=upcoming_appointments)
 
 
+@app.route('/api/patients/<int:patient_id>/timeline')
+@login_required
+@query_budget(2)
+def patient_timeline(patient_id):
+    """Patient history, newest first (?after=<cursor>&limit=20)"""
+    clinic_id = session['clinic_id']
+    if not db.session.query(Patient.id).filter_by(id=patient_id, clinic_id=clinic_id).first():
+        return jsonify({'error': 'Patient not found'}), 404
+    
+    entries, next_cursor = timeline_page(clinic_id, patient_id, request.args.get('after'),
+                                         request.args.get('limit', 20, type=int))
+    for entry in entries:
+        add_timeline_links(entry)
+        entry['at'] = entry['at'].isoformat()
+    return jsonify({'entries': entries, 'next': next_cursor})
+
+
+def add_timeline_links(entry):
+    """View/edit pages for a timeline entry (appointments have none; only prescriptions are editable)"""
+    entry['url'] = entry['edit_url'] = None
+    if entry['kind'] == 'consultation':
+        entry['url'] = url_for('view_consultation', consultation_id=entry['id'])
+    elif entry['kind'] == 'prescription':
+        entry['url'] = url_for('view_prescription', prescription_id=entry['id'])
+        entry['edit_url'] = url_for('edit_prescription', prescription_id=entry['id'])
+
+
 # ==================== APPOINTMENT ROUTES ====================
 
 @app.route('/appointments')
 @login_required
+@query_budget(2)
 def appointments():
     """List appointments"""
     clinic_id = session['clinic_id']
     selected_date = request.args.get('date', str(date.today()))
     
+    # Patient joined, consultation batch-loaded (same profile as the dashboard)
     appointments = Appointment.query.filter_by(
         clinic_id=clinic_id,
         appointment_date=selected_date
+    ).options(
+        db.joinedload(Appointment.patient),
+        db.selectinload(Appointment.consultation)
     ).order_by(Appointment.appointment_time).all()
     
     return render_template('appointments/list.html',
@@ -378,27 +761,47 @@ def book_appointment():
     
     if request.method == 'POST':
         try:
-            appointment = Appointment(
-                clinic_id=clinic_id,
-                patient_id=int(request.form.get('patient_id')),
-                appointment_date=datetime.strptime(request.form.get('appointment_date'), '%Y-%m-%d').date(),
-                appointment_time=request.form.get('appointment_time'),
-                reason=request.form.get('reason'),
-                status='scheduled'
+            # Rejected if it overlaps another active appointment (checked atomically)
+            appointment = book_slot(
+                clinic_id,
+                int(request.form.get('patient_id')),
+                datetime.strptime(request.form.get('appointment_date'), '%Y-%m-%d').date(),
+                request.form.get('appointment_time'),
+                reason=request.form.get('reason')
             )
-            
-            db.session.add(appointment)
+            schedule_appointment(db.session.get(Clinic, clinic_id), appointment)
             db.session.commit()
             
             flash('Appointment booked successfully!', 'success')
             return redirect(url_for('appointments'))
+        except SlotUnavailable as e:
+            db.session.rollback()
+            flash(f'{str(e)}, please pick another time', 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'Error: {str(e)}', 'error')
     
-    # Get patients for dropdown
-    patients = Patient.query.filter_by(clinic_id=clinic_id).order_by(Patient.name).all()
-    return render_template('appointments/book.html', patients=patients, today=date.today())
+    # Patients are picked via the /api/patients/search typeahead
+    return render_template('appointments/book.html', today=date.today())
+
+
+@app.route('/api/appointments/slots')
+@login_required
+@query_budget(2)
+def appointment_slots():
+    """Bookable slots from working hours and consultation duration (?start=YYYY-MM-DD&days=7)"""
+    try:
+        first_day = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else date.today()
+    except ValueError:
+        return jsonify({'error': 'start must be YYYY-MM-DD'}), 400
+    days = min(max(request.args.get('days', 7, type=int), 1), MAX_DAYS)
+    
+    clinic = db.session.get(Clinic, session['clinic_id'])
+    return jsonify({
+        'duration': clinic.consultation_duration,
+        'working_hours': {'start': clinic.working_hours_start, 'end': clinic.working_hours_end},
+        'days': available_slots(clinic, first_day, days)
+    })
 
 
 @app.route('/appointments/<int:appointment_id>/checkin', methods=['POST'])
@@ -458,10 +861,15 @@ def new_consultation(appointment_id):
             appointment.status = 'completed'
             appointment.completed_at = datetime.utcnow()
             
-            # Update patient last visit
+            # Update patient last visit and visit counter (in the same UPDATE)
             patient.last_visit = datetime.utcnow()
+            patient.visit_count = Patient.visit_count + 1
             
             db.session.add(consultation)
+            db.session.flush()
+            schedule_follow_up(clinic, consultation)
+            DailyClinicStats.record(clinic_id, datetime.utcnow().date(),
+                                    consultations=1, collection=consultation.total_amount)
             db.session.commit()
             
             flash('Consultation saved successfully!', 'success')
@@ -482,38 +890,109 @@ def new_consultation(appointment_id):
 @app.route('/consultations/<int:consultation_id>')
 @login_required
 def view_consultation(consultation_id):
-    """View consultation details / Print prescription"""
+    """View consultation details / Print prescription (conditional GET: 304 if unchanged)"""
     clinic_id = session['clinic_id']
-    consultation = Consultation.query.filter_by(
-        id=consultation_id,
-        clinic_id=clinic_id
-    ).first_or_404()
+    # Consultations are not edited after creation; the clinic row covers the letterhead
+    version = db.session.query(Consultation.consultation_date, Clinic.updated_at).join(
+        Clinic, Clinic.id == Consultation.clinic_id
+    ).filter(Consultation.id == consultation_id, Consultation.clinic_id == clinic_id).first_or_404()
     
-    return render_template('consultations/view.html', consultation=consultation)
+    def render():
+        consultation = Consultation.query.filter_by(id=consultation_id, clinic_id=clinic_id).first_or_404()
+        return render_template('consultations/view.html', consultation=consultation)
+    
+    return conditional_page(page_etag('consultation', consultation_id, *version),
+                            max(filter(None, version), default=None), render)
 
 
 # ==================== PRESCRIPTION ROUTES ====================
 
+def prescription_to_dict(prescription):
+    """JSON payload for prescription list rows"""
+    return {
+        'id': prescription.id,
+        'prescription_number': prescription.prescription_number,
+        'patient': {
+            'id': prescription.patient.id,
+            'patient_id': prescription.patient.patient_id,
+            'name': prescription.patient.name
+        },
+        'diagnosis': prescription.diagnosis,
+        'medicine_count': prescription.medicine_count,
+        'created_at': prescription.created_at.isoformat() if prescription.created_at else None
+    }
+
+
 @app.route('/prescriptions')
 @login_required
+@query_budget(2)
 def prescriptions():
-    """List all prescriptions"""
+    """List all prescriptions (cursor-paginated, newest first; ?format=json for JSON)"""
     clinic_id = session['clinic_id']
     search = request.args.get('search', '')
+    per_page = get_per_page(request.args.get('per_page'))
+    
+    # Patient joined in and medicine count as a subquery: one query per page
+    query = Prescription.query.filter_by(clinic_id=clinic_id).options(
+        db.joinedload(Prescription.patient),
+        db.undefer(Prescription.medicine_count)
+    )
     
     if search:
         # Search by patient name, prescription number, or diagnosis
-        prescriptions_list = Prescription.query.filter_by(clinic_id=clinic_id).join(Patient).filter(
+        query = query.join(Prescription.patient).filter(
             (Patient.name.ilike(f'%{search}%')) | 
             (Prescription.prescription_number.ilike(f'%{search}%')) |
             (Prescription.diagnosis.ilike(f'%{search}%'))
-        ).order_by(Prescription.created_at.desc()).all()
-    else:
-        prescriptions_list = Prescription.query.filter_by(clinic_id=clinic_id).order_by(
-            Prescription.created_at.desc()
-        ).limit(100).all()
+        )
+    
+    page = keyset_paginate(query, [Prescription.created_at, Prescription.id], per_page,
+                           after=request.args.get('after'), before=request.args.get('before'))
     
-    return render_template('prescriptions/list.html', prescriptions=prescriptions_list, search=search)
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'prescriptions': [prescription_to_dict(p) for p in page.items],
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor
+        })
+    
+    return render_template('prescriptions/list.html', prescriptions=page.items, page=page,
+                           search=search, per_page=per_page)
+
+
+def medicines_from_form(form):
+    """Medicine lines submitted on the prescription form (blank names skipped), in order"""
+    medicines = []
+    for i in range(int(form.get('medicine_count', 0))):
+        name = form.get(f'medicine_name_{i}')
+        if name and name.strip():
+            medicines.append({field: form.get(f'medicine_{field}_{i}') for field in Medicine.FIELDS})
+    return medicines
+
+
+def record_library_usage(clinic_id, medicines, diagnostic_tests, removed_medicines=()):
+    """
+    Upsert the prescription's medicines and tests into the clinic's
+    autocomplete libraries, count their dosing values (uncounting
+    `removed_medicines`) and refresh the affected defaults. Caller commits,
+    then passes the result to record_library_rows().
+    """
+    touched = MedicineDosingStat.record(clinic_id, medicines, removed_medicines)
+    medicine_rows = MedicineMaster.record_usage(clinic_id, medicines)
+    dosing = MedicineDosingStat.refresh_library(clinic_id, touched)
+    test_rows = DiagnosticTestMaster.record_usage(clinic_id, diagnostic_test_names(diagnostic_tests))
+    return medicine_rows, test_rows, dosing
+
+
+def record_library_rows(clinic_id, library_rows):
+    """Apply committed library upserts to this worker's autocomplete indexes"""
+    medicine_rows, test_rows, dosing = library_rows
+    for row in medicine_rows:
+        entry = dict(row._mapping, dosing_options={})
+        entry.update(dosing.get(row.name, {}))
+        medicine_index.record(clinic_id, entry)
+    for row in test_rows:
+        test_index.record(clinic_id, dict(row._mapping))
 
 
 @app.route('/prescriptions/new/<int:patient_id>', methods=['GET', 'POST'])
@@ -534,7 +1013,7 @@ def new_prescription(patient_id):
     
     if request.method == 'POST':
         try:
-            # Generate prescription number
+            # Allocate prescription number from the clinic's counter
             prescription_number = Prescription.generate_prescription_number(clinic_id)
             
             # Create prescription
@@ -557,26 +1036,21 @@ def new_prescription(patient_id):
                 ).date()
             
             db.session.add(prescription)
+            patient.prescription_count = Patient.prescription_count + 1
             db.session.flush()  # Get prescription.id
             
             # Add medicines
-            medicine_count = int(request.form.get('medicine_count', 0))
-            for i in range(medicine_count):
-                name = request.form.get(f'medicine_name_{i}')
-                if name and name.strip():  # Only add if name is provided
-                    medicine = Medicine(
-                        prescription_id=prescription.id,
-                        name=name,
-                        dosage=request.form.get(f'medicine_dosage_{i}'),
-                        frequency=request.form.get(f'medicine_frequency_{i}'),
-                        duration=request.form.get(f'medicine_duration_{i}'),
-                        timing=request.form.get(f'medicine_timing_{i}'),
-                        instructions=request.form.get(f'medicine_instructions_{i}'),
-                        order=i
-                    )
-                    db.session.add(medicine)
+            medicines = medicines_from_form(request.form)
+            for order, values in enumerate(medicines):
+                db.session.add(Medicine(prescription_id=prescription.id, order=order, **values))
+            
+            # Update medicine/test libraries in the same transaction
+            library_rows = record_library_usage(clinic_id, medicines, prescription.diagnostic_tests)
+            if prescription.follow_up_date:
+                schedule_follow_up(db.session.get(Clinic, clinic_id), prescription)
             
             db.session.commit()
+            record_library_rows(clinic_id, library_rows)
             
             flash(f'✅ Prescription {prescription.prescription_number} created successfully!', 'success')
             return redirect(url_for('view_prescription', prescription_id=prescription.id))
@@ -593,14 +1067,19 @@ def new_prescription(patient_id):
 @app.route('/prescriptions/<int:prescription_id>')
 @login_required
 def view_prescription(prescription_id):
-    """View prescription details / Print"""
+    """View prescription details / Print (conditional GET: 304 if unchanged)"""
     clinic_id = session['clinic_id']
-    prescription = Prescription.query.filter_by(
-        id=prescription_id,
-        clinic_id=clinic_id
-    ).first_or_404()
+    # Cheap version check first; the page itself is only loaded on a miss
+    version = db.session.query(Prescription.updated_at, Clinic.updated_at).join(
+        Clinic, Clinic.id == Prescription.clinic_id
+    ).filter(Prescription.id == prescription_id, Prescription.clinic_id == clinic_id).first_or_404()
     
-    return render_template('prescriptions/view.html', prescription=prescription)
+    def render():
+        prescription = Prescription.query.filter_by(id=prescription_id, clinic_id=clinic_id).first_or_404()
+        return render_template('prescriptions/view.html', prescription=prescription)
+    
+    return conditional_page(page_etag('prescription', prescription_id, *version),
+                            max(filter(None, version), default=None), render)
 
 
 @app.route('/prescriptions/<int:prescription_id>/edit', methods=['GET', 'POST'])
@@ -615,13 +1094,14 @@ def edit_prescription(prescription_id):
     
     if request.method == 'POST':
         try:
-            # Update prescription details
+            previous_tests = set(diagnostic_test_names(prescription.diagnostic_tests))
+            
+            # Update prescription details (unchanged values don't dirty the row)
             prescription.diagnosis = request.form.get('diagnosis')
             prescription.notes = request.form.get('notes')
             prescription.diagnostic_tests = request.form.get('diagnostic_tests')
             prescription.referral_to = request.form.get('referral_to')
             prescription.referral_reason = request.form.get('referral_reason')
-            prescription.updated_at = datetime.utcnow()
             
             # Follow-up date
             if request.form.get('follow_up_date'):
@@ -631,27 +1111,20 @@ def edit_prescription(prescription_id):
             else:
                 prescription.follow_up_date = None
             
-            # Delete existing medicines
-            Medicine.query.filter_by(prescription_id=prescription.id).delete()
+            # Only the medicine lines that differ are updated, inserted or deleted
+            changed_medicines, removed_medicines = prescription.sync_medicines(medicines_from_form(request.form))
+            if db.session.new or any(db.session.is_modified(obj) for obj in db.session.dirty):
+                prescription.updated_at = datetime.utcnow()
             
-            # Add updated medicines
-            medicine_count = int(request.form.get('medicine_count', 0))
-            for i in range(medicine_count):
-                name = request.form.get(f'medicine_name_{i}')
-                if name and name.strip():
-                    medicine = Medicine(
-                        prescription_id=prescription.id,
-                        name=name,
-                        dosage=request.form.get(f'medicine_dosage_{i}'),
-                        frequency=request.form.get(f'medicine_frequency_{i}'),
-                        duration=request.form.get(f'medicine_duration_{i}'),
-                        timing=request.form.get(f'medicine_timing_{i}'),
-                        instructions=request.form.get(f'medicine_instructions_{i}'),
-                        order=i
-                    )
-                    db.session.add(medicine)
+            # Libraries count only lines and tests this edit added or changed
+            new_tests = [name for name in diagnostic_test_names(prescription.diagnostic_tests)
+                         if name not in previous_tests]
+            library_rows = record_library_usage(clinic_id, changed_medicines, '\n'.join(new_tests), removed_medicines)
+            if prescription.follow_up_date:
+                schedule_follow_up(db.session.get(Clinic, clinic_id), prescription)
             
             db.session.commit()
+            record_library_rows(clinic_id, library_rows)
             
             flash(f'✅ Prescription {prescription.prescription_number} updated successfully!', 'success')
             return redirect(url_for('view_prescription', prescription_id=prescription.id))
@@ -675,8 +1148,13 @@ def delete_prescription(prescription_id):
     
     try:
         prescription_number = prescription.prescription_number
+        # Its medicine lines no longer count towards the dosing defaults
+        removed = [{field: getattr(med, field) for field in Medicine.FIELDS} for med in prescription.medicines]
+        MedicineDosingStat.refresh_library(clinic_id, MedicineDosingStat.record(clinic_id, [], removed))
+        prescription.patient.prescription_count = Patient.prescription_count - 1
         db.session.delete(prescription)
         db.session.commit()
+        medicine_index.invalidate(clinic_id)
         flash(f'Prescription {prescription_number} deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -687,40 +1165,86 @@ def delete_prescription(prescription_id):
 
 # ==================== MEDICINE AUTOCOMPLETE API ====================
 
+def medicine_to_dict(med):
+    """Autocomplete payload for a MedicineMaster row"""
+    return {
+        'name': med.name,
+        'generic_name': med.generic_name,
+        'common_dosage': med.common_dosage,
+        'common_frequency': med.common_frequency,
+        'common_duration': med.common_duration,
+        'common_timing': med.common_timing,
+        'dosing_options': json.loads(med.dosing_options) if med.dosing_options else {},
+        'usage_count': med.usage_count
+    }
+
+
+def test_to_dict(test):
+    """Autocomplete payload for a DiagnosticTestMaster row"""
+    return {
+        'name': test.name,
+        'category': test.category,
+        'usage_count': test.usage_count
+    }
+
+
+def load_medicine_library(clinic_id, limit):
+    """Load a clinic's highest scoring medicines for the autocomplete index"""
+    medicines = MedicineMaster.query.filter_by(clinic_id=clinic_id).order_by(
+        MedicineMaster.score.desc(),
+        MedicineMaster.name
+    ).limit(limit).all()
+    return [dict(medicine_to_dict(med), score=med.score) for med in medicines]
+
+
+def load_test_library(clinic_id, limit):
+    """Load a clinic's highest scoring diagnostic tests for the autocomplete index"""
+    tests = DiagnosticTestMaster.query.filter_by(clinic_id=clinic_id).order_by(
+        DiagnosticTestMaster.score.desc(),
+        DiagnosticTestMaster.name
+    ).limit(limit).all()
+    return [dict(test_to_dict(test), score=test.score) for test in tests]
+
+
+medicine_index = AutocompleteIndex(
+    load_medicine_library,
+    max_clinics=app.config['AUTOCOMPLETE_MAX_CLINICS'],
+    max_entries=app.config['AUTOCOMPLETE_MAX_ENTRIES'],
+    ttl=app.config['AUTOCOMPLETE_TTL_SECONDS'],
+    fuzzy_budget_ms=app.config['AUTOCOMPLETE_FUZZY_BUDGET_MS']
+)
+test_index = AutocompleteIndex(
+    load_test_library,
+    max_clinics=app.config['AUTOCOMPLETE_MAX_CLINICS'],
+    max_entries=app.config['AUTOCOMPLETE_MAX_ENTRIES'],
+    ttl=app.config['AUTOCOMPLETE_TTL_SECONDS'],
+    fuzzy_budget_ms=app.config['AUTOCOMPLETE_FUZZY_BUDGET_MS']
+)
+
+
 @app.route('/api/medicines/search')
 @login_required
 def search_medicines():
-    """Search medicines for autocomplete"""
+    """Search medicines for autocomplete (empty/one-letter queries: the clinic's top medicines)"""
     clinic_id = session['clinic_id']
     query = request.args.get('q', '').strip()
     
-    if not query or len(query) < 2:
-        return jsonify([])
+    # Served from the in-memory index; no database round trip once loaded
+    results, complete = medicine_index.search(clinic_id, query, limit=10)
+    if complete:
+        return jsonify(results)
     
-    # Search in medicine master (case-insensitive)
+    # Library larger than the memory budget: fall back to the database
     medicines = MedicineMaster.query.filter_by(clinic_id=clinic_id).filter(
-        db.or_(
-            MedicineMaster.name.ilike(f'{query}%'),
-            MedicineMaster.name.ilike(f'%{query}%')
-        )
+        MedicineMaster.name.ilike(f'%{query}%')
     ).order_by(
-        MedicineMaster.usage_count.desc(),
+        MedicineMaster.name.ilike(f'{query}%').desc(),
+        MedicineMaster.score.desc(),
         MedicineMaster.name
     ).limit(10).all()
     
-    results = []
-    for med in medicines:
-        results.append({
-            'name': med.name,
-            'generic_name': med.generic_name,
-            'common_dosage': med.common_dosage,
-            'common_frequency': med.common_frequency,
-            'common_duration': med.common_duration,
-            'common_timing': med.common_timing,
-            'usage_count': med.usage_count
-        })
-    
-    return jsonify(results)
+    # Nothing matched as typed: keep the index's typo matches
+    return jsonify([medicine_to_dict(med) for med in medicines] or results)
 
 
 @app.route('/api/medicines/add', methods=['POST'])
@@ -742,19 +1266,16 @@ def add_medicine_to_master():
         ).first()
         
         if medicine:
-            # Update usage count and last used
+            # Update usage count, score and last used
             medicine.usage_count += 1
+            medicine.score = (medicine.score or 0) + usage_score()
             medicine.last_used = datetime.utcnow()
             
-            # Update common values if provided
-            if data.get('dosage'):
-                medicine.common_dosage = data.get('dosage')
-            if data.get('frequency'):
-                medicine.common_frequency = data.get('frequency')
-            if data.get('duration'):
-                medicine.common_duration = data.get('duration')
-            if data.get('timing'):
-                medicine.common_timing = data.get('timing')
+            # Defaults come from prescription history (MedicineDosingStat);
+            # values sent here only fill in ones that were never set
+            for field in MedicineDosingStat.FIELDS:
+                if data.get(field) and not getattr(medicine, f'common_{field}'):
+                    setattr(medicine, f'common_{field}', data.get(field))
         else:
             # Create new medicine entry
             medicine = MedicineMaster(
@@ -766,11 +1287,13 @@ def add_medicine_to_master():
                 common_duration=data.get('duration'),
                 common_timing=data.get('timing'),
                 category=data.get('category'),
-                usage_count=1
+                usage_count=1,
+                score=usage_score()
             )
             db.session.add(medicine)
         
         db.session.commit()
+        medicine_index.record(clinic_id, dict(medicine_to_dict(medicine), score=medicine.score))
         return jsonify({'success': True, 'message': 'Medicine added to library'})
         
     except Exception as e:
@@ -785,33 +1308,26 @@ def add_medicine_to_master():
 @app.route('/api/tests/search')
 @login_required
 def search_diagnostic_tests():
-    """Search diagnostic tests for autocomplete"""
+    """Search diagnostic tests for autocomplete (empty/one-letter queries: the clinic's top tests)"""
     clinic_id = session['clinic_id']
     query = request.args.get('q', '').strip()
     
-    if not query or len(query) < 2:
-        return jsonify([])
+    # Served from the in-memory index; no database round trip once loaded
+    results, complete = test_index.search(clinic_id, query, limit=10)
+    if complete:
+        return jsonify(results)
     
-    # Search in diagnostic test master (case-insensitive)
+    # Library larger than the memory budget: fall back to the database
     tests = DiagnosticTestMaster.query.filter_by(clinic_id=clinic_id).filter(
-        db.or_(
-            DiagnosticTestMaster.name.ilike(f'{query}%'),
-            DiagnosticTestMaster.name.ilike(f'%{query}%')
-        )
+        DiagnosticTestMaster.name.ilike(f'%{query}%')
     ).order_by(
-        DiagnosticTestMaster.usage_count.desc(),
+        DiagnosticTestMaster.name.ilike(f'{query}%').desc(),
+        DiagnosticTestMaster.score.desc(),
         DiagnosticTestMaster.name
     ).limit(10).all()
     
-    results = []
-    for test in tests:
-        results.append({
-            'name': test.name,
-            'category': test.category,
-            'usage_count': test.usage_count
-        })
-    
-    return jsonify(results)
+    # Nothing matched as typed: keep the index's typo matches
+    return jsonify([test_to_dict(test) for test in tests] or results)
 
 
 @app.route('/api/tests/add', methods=['POST'])
@@ -833,8 +1349,9 @@ def add_test_to_master():
         ).first()
         
         if test:
-            # Update usage count and last used
+            # Update usage count, score and last used
             test.usage_count += 1
+            test.score = (test.score or 0) + usage_score()
             test.last_used = datetime.utcnow()
         else:
             # Create new test entry
@@ -842,11 +1359,13 @@ def add_test_to_master():
                 clinic_id=clinic_id,
                 name=test_name,
                 category=data.get('category'),
-                usage_count=1
+                usage_count=1,
+                score=usage_score()
             )
             db.session.add(test)
         
         db.session.commit()
+        test_index.record(clinic_id, dict(test_to_dict(test), score=test.score))
         return jsonify({'success': True, 'message': 'Test added to library'})
         
     except Exception as e:
@@ -0,0 +1,228 @@
+"""
+In-memory autocomplete index for the medicine and test libraries
+Keeps each clinic's library names in RAM so typing never hits the database.
+Entries are ranked by their decayed usage score (models.usage_score); the
+best TOP_K per clinic, and per first letter, are kept presorted so empty
+and one-letter queries are a slice. When a query has fewer exact matches
+than asked for, misspellings are matched by bounded edit distance over
+trigram candidates, within a fixed time budget.
+"""
+from collections import OrderedDict
+from bisect import bisect_left, insort
+import heapq
+import threading
+import time
+
+TOP_K = 20
+FUZZY_MIN_LENGTH = 4       # shorter queries match too much to be useful
+FUZZY_MAX_CANDIDATES = 200  # best trigram overlaps that get an edit-distance check
+
+
+def _ngrams(text, n):
+    """Return the set of n-character substrings of text"""
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def max_typos(length):
+    """Edits tolerated for a query of `length` characters"""
+    return 1 if length < 6 else 2 if length < 10 else 3
+
+
+def prefix_distance(query, name, limit):
+    """
+    Smallest edit distance (with transpositions) between `query` and any
+    prefix of `name`, so partly typed names still match. Returns None once
+    it must exceed `limit`.
+    """
+    previous2 = None
+    previous = list(range(len(name) + 1))
+    for i, qc in enumerate(query, 1):
+        current = [i] + [0] * len(name)
+        for j, nc in enumerate(name, 1):
+            cost = qc != nc
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 and i > 1 and j > 1 and qc == name[j - 2] and query[i - 2] == nc:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return None
+        previous2, previous = previous, current
+    best = min(previous)
+    return best if best <= limit else None
+
+
+class ClinicIndex:
+    """Prefix + n-gram index over one clinic's library entries"""
+
+    def __init__(self, entries, truncated=False):
+        self.entries = {}      # lowercased name -> payload dict
+        self.scores = {}       # lowercased name -> ranking score
+        self.sorted_keys = []  # lowercased names, sorted (prefix lookups)
+        self.grams = {}        # 2/3-gram -> set of lowercased names (substring lookups)
+        self.top = {}          # '' or first letter -> best TOP_K [(-score, name)], sorted
+        self.truncated = truncated
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()  # one clinic's searches/writes; other clinics never wait on it
+        for entry in entries:
+            self.upsert(entry)
+
+    def rank(self, key):
+        return (-self.scores[key], key)
+
+    def upsert(self, entry):
+        entry = dict(entry)
+        score = entry.pop('score', None) or 0
+        key = entry['name'].lower()
+        if key not in self.entries:
+            insort(self.sorted_keys, key)
+            for n in (2, 3):
+                for gram in _ngrams(key, n):
+                    self.grams.setdefault(gram, set()).add(key)
+        previous = self.scores.get(key)
+        self.entries[key] = entry
+        self.scores[key] = score
+
+        # Scores only grow, so an entry can enter or move up a top list but
+        # never needs to be replaced by one from outside it
+        for prefix in ('', key[:1]):
+            top = self.top.setdefault(prefix, [])
+            if previous is not None:
+                i = bisect_left(top, (-previous, key))
+                if i < len(top) and top[i] == (-previous, key):
+                    del top[i]
+            insort(top, (-score, key))
+            del top[TOP_K:]
+
+    def suggest(self, query, limit):
+        """Best entries overall ('') or starting with one letter, precomputed"""
+        return [self.entries[key] for _, key in self.top.get(query.lower(), [])[:limit]]
+
+    def fuzzy(self, q, limit, exclude, deadline):
+        """
+        Names within max_typos(len(q)) edits of `q` (or of one of their
+        prefixes): candidates share the most trigrams with `q`, and checking
+        stops at `deadline` (time.monotonic()). Closest first, then by score.
+        """
+        overlap = {}
+        for gram in _ngrams(q, 3):
+            for key in self.grams.get(gram, ()):
+                overlap[key] = overlap.get(key, 0) + 1
+        candidates = heapq.nlargest(FUZZY_MAX_CANDIDATES, overlap, key=overlap.get)
+
+        limit_typos = max_typos(len(q))
+        matches = []
+        for checked, key in enumerate(candidates):
+            if checked % 16 == 0 and time.monotonic() > deadline:
+                break
+            if key in exclude:
+                continue
+            distance = prefix_distance(q, key, limit_typos)
+            if distance is not None:
+                matches.append(((distance,) + self.rank(key), key))
+        return [key for _, key in heapq.nsmallest(limit, matches)]
+
+    def search(self, query, limit, fuzzy_deadline=None):
+        """
+        Prefix matches first, then substring matches; each ranked by score.
+        If those come to fewer than `limit`, near misses fill the rest
+        (unless `fuzzy_deadline` is None).
+        """
+        q = query.lower()
+        if len(q) < 2:
+            return self.suggest(q, limit)
+        rank = self.rank
+
+        # Prefix matches: contiguous run in the sorted key list
+        prefix = []
+        i = bisect_left(self.sorted_keys, q)
+        while i < len(self.sorted_keys) and self.sorted_keys[i].startswith(q):
+            prefix.append(self.sorted_keys[i])
+            i += 1
+        results = heapq.nsmallest(limit, prefix, key=rank)
+
+        if len(results) < limit:
+            # Substring matches: intersect n-gram posting lists, then verify
+            n = 3 if len(q) >= 3 else 2
+            postings = sorted((self.grams.get(g, set()) for g in _ngrams(q, n)), key=len)
+            if postings:
+                candidates = set(postings[0]).intersection(*postings[1:])
+                seen = set(prefix)
+                contains = [k for k in candidates if k not in seen and q in k]
+                results += heapq.nsmallest(limit - len(results), contains, key=rank)
+
+        if len(results) < limit and fuzzy_deadline is not None and len(q) >= FUZZY_MIN_LENGTH:
+            results += self.fuzzy(q, limit - len(results), set(results), fuzzy_deadline)
+
+        return [self.entries[key] for key in results]
+
+
+class AutocompleteIndex:
+    """
+    Per-clinic autocomplete cache with a fixed memory budget.
+
+    At most `max_clinics` clinic indexes are kept (least recently used are
+    evicted) and each holds at most `max_entries` names, the most used ones.
+    Indexes are rebuilt from the database after `ttl` seconds so writes made
+    by other workers show up eventually; writes made by this worker are
+    applied immediately via `record()`.
+    """
+
+    def __init__(self, loader, max_clinics=200, max_entries=5000, ttl=300, fuzzy_budget_ms=10):
+        self.loader = loader  # loader(clinic_id, limit) -> list of payload dicts
+        self.max_clinics = max_clinics
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_budget = fuzzy_budget_ms / 1000  # 0 disables typo matching
+        self._clinics = OrderedDict()
+        self._lock = threading.Lock()  # guards _clinics only; each ClinicIndex has its own lock
+
+    def _get(self, clinic_id):
+        with self._lock:
+            index = self._clinics.get(clinic_id)
+            if index and time.monotonic() - index.loaded_at < self.ttl:
+                self._clinics.move_to_end(clinic_id)
+                return index
+
+        # Load outside the lock; one extra row tells us whether we truncated
+        entries = self.loader(clinic_id, self.max_entries + 1)
+        index = ClinicIndex(entries[:self.max_entries], truncated=len(entries) > self.max_entries)
+
+        with self._lock:
+            self._clinics[clinic_id] = index
+            self._clinics.move_to_end(clinic_id)
+            while len(self._clinics) > self.max_clinics:
+                self._clinics.popitem(last=False)
+        return index
+
+    def search(self, clinic_id, query, limit=10):
+        """
+        Return (results, complete). `complete` is False when the clinic's
+        library did not fit the budget and the caller may need to fall back
+        to the database for a short result list. Empty and one-letter
+        queries come from the precomputed top lists and are always complete
+        (the index holds the clinic's highest scores).
+        """
+        index = self._get(clinic_id)
+        deadline = time.monotonic() + self.fuzzy_budget if self.fuzzy_budget else None
+        with index.lock:
+            results = index.search(query, limit, deadline)
+        return results, not index.truncated or len(results) >= limit or len(query) < 2
+
+    def record(self, clinic_id, entry):
+        """Apply a committed library write to the cached index (if loaded)"""
+        with self._lock:
+            index = self._clinics.get(clinic_id)
+        if not index:
+            return
+        with index.lock:
+            if entry['name'].lower() not in index.entries and len(index.entries) >= self.max_entries:
+                index.truncated = True  # over budget: let the database serve the overflow
+                return
+            index.upsert(entry)
+
+    def invalidate(self, clinic_id=None):
+        """Drop one clinic's index, or all of them"""
+        with self._lock:
+            if clinic_id is None:
+                self._clinics.clear()
+            else:
+                self._clinics.pop(clinic_id, None)
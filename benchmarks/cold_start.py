@@ -0,0 +1,78 @@
+"""
+Cold-start benchmark
+Starts a fresh Python process per run (like a new serverless instance),
+imports app.py and serves one request, and reports import and
+import-to-first-response times as JSON.
+
+Usage:
+    python benchmarks/cold_start.py [--runs 10] [--path /login]
+
+Uses DATABASE_URL / SCHEMA_CHECK from the environment, so the same script
+measures SQLite locally or a Supabase database.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside each child process
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app as clinic_app
+imported = time.perf_counter()
+response = clinic_app.app.test_client().get({path!r})
+done = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'first_response_ms': (done - start) * 1000,
+    'status': response.status_code
+}}))
+"""
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(values):
+    return {
+        'min': round(min(values), 2),
+        'p50': round(statistics.median(values), 2),
+        'p95': round(percentile(values, 95), 2),
+        'max': round(max(values), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/login', help='Route requested after import')
+    args = parser.parse_args()
+
+    code = CHILD.format(root=ROOT, path=args.path)
+    samples = []
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT, check=True)
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    print(json.dumps({
+        'benchmark': 'cold_start',
+        'path': args.path,
+        'runs': args.runs,
+        'schema_check': os.environ.get('SCHEMA_CHECK', 'auto'),
+        'import_ms': summarize([s['import_ms'] for s in samples]),
+        'first_response_ms': summarize([s['first_response_ms'] for s in samples]),
+        'statuses': sorted({s['status'] for s in samples})
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+Synthetic clinic dataset generator
+Populates the database named by DATABASE_URL (SQLite clinic.db by default)
+with benchmark clinics: patients, appointments, consultations, prescriptions
+with medicines, and the medicine/test libraries.
+
+Usage:
+    python benchmarks/generate_data.py --clinics 1 --patients 50000 --seed 42
+
+Clinics are created as bench-<n>@example.com / password "benchmark".
+Distributions: visits per patient are geometric (most patients come once or
+twice, a chronic tail comes often), medicine and test popularity is Zipf-like,
+and visit dates are spread over --days with more recent activity.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, init_db  # noqa: E402
+from models import (db, Clinic, Patient, Appointment, Consultation, Prescription, Medicine,  # noqa: E402
+                    MedicineMaster, MedicineDosingStat, DiagnosticTestMaster, DailyClinicStats, IdSequence)
+
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Arjun', 'Sai', 'Rohan', 'Rahul', 'Amit', 'Suresh', 'Ramesh',
+               'Priya', 'Ananya', 'Diya', 'Isha', 'Kavya', 'Meera', 'Neha', 'Pooja', 'Sneha', 'Lakshmi',
+               'Mohammed', 'Imran', 'Farhan', 'Ayesha', 'Fatima', 'John', 'Mary', 'Joseph', 'Anjali', 'Gita']
+LAST_NAMES = ['Sharma', 'Verma', 'Gupta', 'Kumar', 'Singh', 'Patel', 'Shah', 'Reddy', 'Rao', 'Nair',
+              'Iyer', 'Menon', 'Das', 'Bose', 'Khan', 'Jain', 'Mehta', 'Joshi', 'Pillai', 'Fernandes']
+MEDICINES = ['Paracetamol', 'Ibuprofen', 'Amoxicillin', 'Azithromycin', 'Cetrizine', 'Pantoprazole',
+             'Dextromethorphan', 'Metformin', 'Amlodipine', 'Atorvastatin', 'Omeprazole', 'Losartan',
+             'Levocetirizine', 'Montelukast', 'Ciprofloxacin', 'Doxycycline', 'Diclofenac', 'Ondansetron',
+             'Domperidone', 'Ranitidine', 'Telmisartan', 'Glimepiride', 'Vitamin D3', 'Calcium Carbonate',
+             'Folic Acid', 'Iron Sucrose', 'Salbutamol', 'Budesonide', 'Prednisolone', 'Cefixime']
+TESTS = ['Complete Blood Count (CBC)', 'Lipid Profile', 'Liver Function Test (LFT)', 'Kidney Function Test (KFT)',
+         'Thyroid Profile', 'HbA1c', 'Fasting Blood Sugar', 'Urine Routine', 'X-Ray Chest', 'ECG',
+         'Ultrasound Abdomen', 'Vitamin D', 'Vitamin B12', 'Dengue NS1', 'Widal Test', 'CRP']
+DIAGNOSES = ['Viral fever', 'Upper respiratory tract infection', 'Hypertension', 'Type 2 diabetes',
+             'Gastritis', 'Allergic rhinitis', 'Migraine', 'Acute gastroenteritis', 'Urinary tract infection',
+             'Lower back pain', 'Bronchial asthma', 'Anemia', 'Hypothyroidism', 'Dermatitis']
+DOSAGES = ['250mg', '500mg', '650mg', '10mg', '20mg', '40mg', '5ml', '10ml']
+FREQUENCIES = ['1-0-1', '1-1-1', '0-0-1', '1-0-0', '0-1-0', 'SOS']
+DURATIONS = ['3 days', '5 days', '7 days', '10 days', '2 weeks', '1 month']
+TIMINGS = ['Before food', 'After food', 'Empty stomach', 'At bedtime']
+
+
+def zipf_choice(rng, items, s=1.1):
+    """Pick from items with Zipf-like popularity (first items most popular)"""
+    weights = [1 / (rank ** s) for rank in range(1, len(items) + 1)]
+    return rng.choices(items, weights=weights)[0]
+
+
+def recent_datetime(rng, now, days):
+    """Random time within the last `days`, skewed towards recent dates"""
+    offset = days * (1 - rng.random() ** 0.7)
+    moment = now - timedelta(days=offset)
+    return moment.replace(hour=rng.randint(9, 17), minute=rng.choice([0, 15, 30, 45]), second=0, microsecond=0)
+
+
+def insert_returning_ids(model, rows):
+    """Bulk insert rows and return their primary keys in order"""
+    stmt = db.insert(model).returning(model.id, sort_by_parameter_order=True)
+    return list(db.session.execute(stmt, rows).scalars())
+
+
+def flush_batch(model, rows):
+    if rows:
+        db.session.execute(db.insert(model), rows)
+        rows.clear()
+
+
+def generate_clinic(rng, number, args, now):
+    clinic = Clinic(
+        clinic_name=f'Benchmark Clinic {number}', doctor_name=f'Bench {number}',
+        specialization='General Physician', phone='9000000000',
+        email=f'bench-{number}@example.com', consultation_fee=300
+    )
+    clinic.set_password('benchmark')
+    db.session.add(clinic)
+    db.session.flush()
+    cid = clinic.id
+
+    medicine_names = MEDICINES + [f'Medx-{i:04d}' for i in range(max(0, args.medicines - len(MEDICINES)))]
+    medicine_names = medicine_names[:args.medicines]
+    test_names = (TESTS + [f'Lab Test {i:03d}' for i in range(max(0, args.tests - len(TESTS)))])[:args.tests]
+    medicine_usage = {name: 0 for name in medicine_names}
+    test_usage = {name: 0 for name in test_names}
+
+    counts = {'patients': 0, 'appointments': 0, 'consultations': 0, 'prescriptions': 0, 'medicines': 0}
+    patient_ids = Patient.generate_patient_ids(cid, args.patients)
+
+    for start in range(0, args.patients, args.batch_size):
+        chunk = patient_ids[start:start + args.batch_size]
+        patients = []
+        for pid in chunk:
+            registered = recent_datetime(rng, now, args.days)
+            patients.append({
+                'clinic_id': cid, 'patient_id': pid,
+                'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                'age': max(0, min(95, int(rng.gauss(38, 18)))),
+                'gender': rng.choice(['Male', 'Female']),
+                'phone': f'9{rng.randint(100000000, 999999999)}',
+                'registration_date': registered
+            })
+        ids = insert_returning_ids(Patient, patients)
+        counts['patients'] += len(ids)
+
+        appointments, consultations, visit_meta = [], [], []
+        for patient_id, patient in zip(ids, patients):
+            # Geometric visit count: mean ~ args.visits
+            visits = 1
+            while rng.random() < 1 - 1 / args.visits and visits < 200:
+                visits += 1
+            for _ in range(visits):
+                when = patient['registration_date'] + timedelta(days=rng.random() * max(1, (now - patient['registration_date']).days))
+                when = min(when, now)
+                appointments.append({
+                    'clinic_id': cid, 'patient_id': patient_id, 'appointment_date': when.date(),
+                    'appointment_time': when.strftime('%H:%M'), 'status': 'completed',
+                    'created_at': when, 'completed_at': when
+                })
+                visit_meta.append((patient_id, when))
+
+        appointment_ids = insert_returning_ids(Appointment, appointments)
+        counts['appointments'] += len(appointment_ids)
+        for appointment_id, (patient_id, when) in zip(appointment_ids, visit_meta):
+            paid = rng.random() < 0.85
+            consultations.append({
+                'clinic_id': cid, 'patient_id': patient_id, 'appointment_id': appointment_id,
+                'bp_systolic': int(rng.gauss(125, 15)), 'bp_diastolic': int(rng.gauss(80, 10)),
+                'pulse': int(rng.gauss(78, 10)), 'temperature': round(rng.gauss(98.8, 0.8), 1),
+                'diagnosis': zipf_choice(rng, DIAGNOSES), 'consultation_fee': 300, 'total_amount': 300,
+                'payment_status': 'paid' if paid else 'unpaid',
+                'payment_method': rng.choice(['cash', 'upi', 'card']) if paid else None,
+                'consultation_date': when
+            })
+        consultation_ids = insert_returning_ids(Consultation, consultations)
+        counts['consultations'] += len(consultation_ids)
+
+        prescriptions, prescription_meta = [], []
+        prescribed = [(cons_id, cons) for cons_id, cons in zip(consultation_ids, consultations)
+                      if rng.random() < args.prescription_rate]
+        if prescribed:
+            first_number = IdSequence.allocate(cid, 'prescription', len(prescribed), 'RX-', Prescription.prescription_number)
+        for number, (cons_id, cons) in enumerate(prescribed):
+            tests = [zipf_choice(rng, test_names) for _ in range(rng.choice([0, 0, 0, 1, 2]))]
+            for name in tests:
+                test_usage[name] += 1
+            prescriptions.append({
+                'clinic_id': cid, 'patient_id': cons['patient_id'], 'consultation_id': cons_id,
+                'prescription_number': f'RX-{first_number + number:04d}', 'diagnosis': cons['diagnosis'],
+                'diagnostic_tests': '\n'.join(tests) or None,
+                'created_at': cons['consultation_date'], 'updated_at': cons['consultation_date']
+            })
+            prescription_meta.append(cons['consultation_date'])
+        prescription_ids = insert_returning_ids(Prescription, prescriptions)
+        counts['prescriptions'] += len(prescription_ids)
+
+        medicines = []
+        for prescription_id, when in zip(prescription_ids, prescription_meta):
+            for order in range(rng.randint(1, 5)):
+                name = zipf_choice(rng, medicine_names)
+                medicine_usage[name] += 1
+                medicines.append({
+                    'prescription_id': prescription_id, 'name': name, 'dosage': rng.choice(DOSAGES),
+                    'frequency': zipf_choice(rng, FREQUENCIES), 'duration': zipf_choice(rng, DURATIONS),
+                    'timing': rng.choice(TIMINGS), 'order': order, 'created_at': when
+                })
+                if len(medicines) >= args.batch_size:
+                    counts['medicines'] += len(medicines)
+                    flush_batch(Medicine, medicines)
+        counts['medicines'] += len(medicines)
+        flush_batch(Medicine, medicines)
+        db.session.commit()
+
+    db.session.execute(db.insert(MedicineMaster), [{
+        'clinic_id': cid, 'name': name, 'usage_count': used, 'last_used': now,
+        'common_dosage': rng.choice(DOSAGES), 'common_frequency': FREQUENCIES[0],
+        'common_duration': DURATIONS[1], 'common_timing': TIMINGS[1], 'created_at': now
+    } for name, used in medicine_usage.items()])
+    db.session.execute(db.insert(DiagnosticTestMaster), [{
+        'clinic_id': cid, 'name': name, 'usage_count': used, 'last_used': now, 'created_at': now
+    } for name, used in test_usage.items()])
+    MedicineMaster.rebuild_scores(cid)
+    DiagnosticTestMaster.rebuild_scores(cid)
+    MedicineDosingStat.rebuild(cid)
+    Patient.rebuild_counters(cid)
+    DailyClinicStats.rebuild(cid)
+    db.session.commit()
+    return cid, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clinics', type=int, default=1)
+    parser.add_argument('--patients', type=int, default=1000, help='Patients per clinic')
+    parser.add_argument('--visits', type=float, default=3.0, help='Mean consultations per patient')
+    parser.add_argument('--prescription-rate', type=float, default=0.8, help='Share of consultations with a prescription')
+    parser.add_argument('--medicines', type=int, default=300, help='Medicine library size per clinic')
+    parser.add_argument('--tests', type=int, default=80, help='Diagnostic test library size per clinic')
+    parser.add_argument('--days', type=int, default=730, help='History span in days')
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    with app.app_context():
+        init_db(force=True)
+        first = Clinic.query.filter(Clinic.email.like('bench-%@example.com')).count() + 1
+        results = {}
+        for number in range(first, first + args.clinics):
+            cid, counts = generate_clinic(rng, number, args, now)
+            results[f'bench-{number}@example.com'] = {'clinic_id': cid, **counts}
+
+    print(json.dumps({'seconds': round(time.perf_counter() - started, 1), 'clinics': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Query plan regression check
+Drives the hot routes (the routes.py scenarios plus a few read-only pages)
+through the Flask test client, captures every SELECT/UPDATE/DELETE they
+run, and EXPLAINs each one against the database named by DATABASE_URL.
+A statement that reads a clinic table without an index is reported and
+the script exits 1, so it can run in CI after generate_data.py.
+
+SQLite: EXPLAIN QUERY PLAN, flagging `SCAN <table>` with no index.
+PostgreSQL: EXPLAIN with enable_seqscan off, flagging `Seq Scan` (the
+planner would still pick an index if one could serve the query).
+
+Declared @query_budget limits are enforced while the routes run, so a
+route that starts issuing more queries (an N+1 regression) also fails.
+It also posts an appointment booking for a patient outside the clinic
+and fails unless the booking is refused (tenant isolation on writes).
+
+Usage:
+    python benchmarks/query_plans.py --clinic bench-1@example.com
+    python benchmarks/query_plans.py --verbose   # print every plan
+"""
+import argparse
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import date, timedelta  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from app import app  # noqa: E402
+from query_budget import QueryBudgetExceeded  # noqa: E402
+from models import db, Clinic, Patient, Appointment  # noqa: E402
+from routes import build_scenarios  # noqa: E402
+
+# Single-row bookkeeping tables, read whole by design
+SMALL_TABLES = {'schema_version'}
+
+_captured = []
+_capturing = [False]
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _capture(conn, cursor, statement, parameters, context, executemany):
+    if _capturing[0] and re.match(r'\s*(SELECT|UPDATE|DELETE|WITH)\b', statement, re.I):
+        _captured.append((statement, parameters[0] if executemany else parameters))
+
+
+def full_scans(connection, statement, parameters):
+    """(plan lines, tables read without an index) for one statement"""
+    tables = set(db.metadata.tables)
+    if connection.dialect.name == 'postgresql':
+        with connection.begin_nested():
+            connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+            plan = [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + statement, parameters)]
+        scans = {m.group(1) for line in plan for m in [re.search(r'Seq Scan on (\w+)', line)] if m}
+    else:
+        plan = [row[3] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        scans = {m.group(1) for line in plan for m in [re.match(r'SCAN (\w+)$', line)] if m}
+        # SQLite names aliased tables by alias (patients_1)
+        scans |= {re.sub(r'_\d+$', '', name) for name in scans}
+    return plan, sorted(scans & tables - SMALL_TABLES)
+
+
+def check_cross_clinic_booking(client, clinic_id):
+    """Book another clinic's patient (or a missing id) as this clinic; True if refused"""
+    with app.app_context():
+        other = db.session.query(db.func.max(Patient.id)).filter(Patient.clinic_id != clinic_id).scalar()
+        patient_id = other or (db.session.query(db.func.max(Patient.id)).scalar() or 0) + 1
+        before = Appointment.query.filter_by(patient_id=patient_id).count()
+    day = (date.today() + timedelta(days=1)).isoformat()
+    response = client.post('/appointments/book', data={
+        'patient_id': patient_id, 'appointment_date': day, 'appointment_time': '23:59'
+    })
+    with app.app_context():
+        booked = Appointment.query.filter_by(patient_id=patient_id).count() > before
+    print(f'cross_clinic_booking: patient {patient_id}, HTTP {response.status_code}, '
+          f'{"❌ booked" if booked else "refused"}')
+    return not booked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clinic', default='bench-1@example.com', help='Clinic email to log in as')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--verbose', action='store_true', help='Print the plan of every statement')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    app.config['QUERY_BUDGET_ENFORCE'] = True
+    app.config['PROPAGATE_EXCEPTIONS'] = True  # surface QueryBudgetExceeded here instead of as a 500
+    # No init_db(): plans are checked against the schema as deployed
+    with app.app_context():
+        clinic = Clinic.query.filter_by(email=args.clinic).first()
+        if not clinic:
+            raise SystemExit(f'No clinic {args.clinic}; run benchmarks/generate_data.py first')
+        scenarios = build_scenarios(rng, clinic.id)
+        patient_id = db.session.query(Patient.id).filter_by(clinic_id=clinic.id).first()[0]
+
+    today = date.today().isoformat()
+    scenarios += [
+        ('patients_list', 'GET', lambda: '/patients', None),
+        ('appointments', 'GET', lambda: f'/appointments?date={today}', None),
+        ('patient_timeline', 'GET', lambda: f'/api/patients/{patient_id}/timeline', None),
+        ('appointment_slots', 'GET', lambda: f'/api/appointments/slots?start={today}', None),
+        ('reports', 'GET', lambda: '/reports', None),
+        ('export_prescriptions', 'GET', lambda: '/export/prescriptions?limit=100', None),
+    ]
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['clinic_id'] = clinic.id
+        sess['clinic_name'] = clinic.clinic_name
+        sess['doctor_name'] = clinic.doctor_name
+
+    failures = 0
+    for name, method, url_factory, form_factory in scenarios:
+        del _captured[:]
+        _capturing[0] = True
+        try:
+            response = client.open(url_factory(), method=method, data=form_factory() if form_factory else None)
+            response.get_data()  # drain streamed responses
+            print(f'{name}: {len(_captured)} statements, HTTP {response.status_code}')
+        except QueryBudgetExceeded as e:
+            failures += 1
+            print(f'{name}: ❌ {e}')
+        finally:
+            _capturing[0] = False
+
+        with app.app_context(), db.engine.connect() as connection:
+            for statement, parameters in _captured:
+                plan, scans = full_scans(connection, statement, parameters)
+                if scans:
+                    failures += 1
+                    print(f'  ❌ full scan of {", ".join(scans)}:\n    {" ".join(statement.split())[:300]}')
+                if scans or args.verbose:
+                    print('\n'.join(f'    | {line}' for line in plan))
+
+    if not check_cross_clinic_booking(client, clinic.id):
+        failures += 1
+
+    print(f'{"❌" if failures else "✅"} {failures} failure(s) (full table scans, query budgets, cross-clinic writes)')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Route-level benchmark suite
+Drives the Flask test client through the hot routes against the database
+named by DATABASE_URL (populate it first with generate_data.py) and reports
+latency percentiles, SQL statements per request and peak Python memory as JSON.
+
+Usage:
+    python benchmarks/routes.py --clinic bench-1@example.com --iterations 50 --output before.json
+    python benchmarks/routes.py --iterations 50 --compare before.json
+
+--compare prints the p50/p95/query deltas against an earlier JSON report, so
+runs from different commits can be compared directly.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+from app import app, init_db  # noqa: E402
+from models import db, Clinic, Patient, MedicineMaster, DiagnosticTestMaster  # noqa: E402
+
+_statements = [0]
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count(conn, cursor, statement, parameters, context, executemany):
+    _statements[0] += 1
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def build_scenarios(rng, clinic_id):
+    """(name, method, url factory, form factory) for each hot route"""
+    patient_ids = [pid for (pid,) in db.session.query(Patient.id).filter_by(clinic_id=clinic_id).limit(5000)]
+    names = [name for (name,) in db.session.query(Patient.name).filter_by(clinic_id=clinic_id).limit(500)]
+    medicines = [name for (name,) in db.session.query(MedicineMaster.name).filter_by(clinic_id=clinic_id).limit(500)]
+    tests = [name for (name,) in db.session.query(DiagnosticTestMaster.name).filter_by(clinic_id=clinic_id).limit(500)]
+    if not patient_ids:
+        raise SystemExit('Clinic has no patients; run benchmarks/generate_data.py first')
+
+    def fragment(words, size):
+        word = rng.choice(words) if words else 'para'
+        return word[:size]
+
+    def prescription_form():
+        form = {'medicine_count': '3', 'diagnosis': 'Benchmark', 'diagnostic_tests': '\n'.join(rng.sample(tests, min(2, len(tests))))}
+        for i in range(3):
+            form.update({f'medicine_name_{i}': fragment(medicines, 40), f'medicine_dosage_{i}': '500mg',
+                         f'medicine_frequency_{i}': '1-0-1', f'medicine_duration_{i}': '5 days',
+                         f'medicine_timing_{i}': 'After food'})
+        return form
+
+    return [
+        ('dashboard', 'GET', lambda: '/dashboard', None),
+        ('patients_search', 'GET', lambda: f'/patients?search={fragment(names, 4)}', None),
+        ('prescriptions_list', 'GET', lambda: '/prescriptions', None),
+        ('view_patient', 'GET', lambda: f'/patients/{rng.choice(patient_ids)}', None),
+        ('medicine_autocomplete', 'GET', lambda: f'/api/medicines/search?q={fragment(medicines, 3)}', None),
+        ('test_autocomplete', 'GET', lambda: f'/api/tests/search?q={fragment(tests, 3)}', None),
+        ('new_prescription', 'POST', lambda: f'/prescriptions/new/{rng.choice(patient_ids)}', prescription_form),
+    ]
+
+
+def run_scenario(client, method, url_factory, form_factory, iterations, warmup):
+    latencies, queries, statuses = [], [], set()
+    for i in range(warmup + iterations):
+        url = url_factory()
+        form = form_factory() if form_factory else None
+        before = _statements[0]
+        started = time.perf_counter()
+        response = client.open(url, method=method, data=form)
+        elapsed = (time.perf_counter() - started) * 1000
+        if i >= warmup:
+            latencies.append(elapsed)
+            queries.append(_statements[0] - before)
+            statuses.add(response.status_code)
+    return latencies, queries, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clinic', default='bench-1@example.com', help='Clinic email to log in as')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', help='Comma-separated scenario names')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    parser.add_argument('--compare', help='Earlier JSON report to diff against')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    app.config['QUERY_BUDGET_ENFORCE'] = False
+    with app.app_context():
+        init_db()
+        clinic = Clinic.query.filter_by(email=args.clinic).first()
+        if not clinic:
+            raise SystemExit(f'No clinic {args.clinic}; run benchmarks/generate_data.py first')
+        scenarios = build_scenarios(rng, clinic.id)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['clinic_id'] = clinic.id
+        sess['clinic_name'] = clinic.clinic_name
+        sess['doctor_name'] = clinic.doctor_name
+
+    only = set(args.only.split(',')) if args.only else None
+    results = {}
+    for name, method, url_factory, form_factory in scenarios:
+        if only and name not in only:
+            continue
+        tracemalloc.start()
+        latencies, queries, statuses = run_scenario(client, method, url_factory, form_factory,
+                                                    args.iterations, args.warmup)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'queries_mean': round(statistics.fmean(queries), 2),
+            'queries_max': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+            'statuses': sorted(statuses)
+        }
+
+    report = {
+        'benchmark': 'routes',
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1],
+        'clinic': args.clinic,
+        'iterations': args.iterations,
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        report['compare'] = {
+            name: {
+                'p50_ms_delta': round(result['p50_ms'] - baseline[name]['p50_ms'], 3),
+                'p95_ms_delta': round(result['p95_ms'] - baseline[name]['p95_ms'], 3),
+                'queries_mean_delta': round(result['queries_mean'] - baseline[name]['queries_mean'], 2)
+            }
+            for name, result in results.items() if name in baseline
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Full data export (CSV / NDJSON)
+Rows are streamed from a server-side cursor (yield_per) straight into the
+response, so memory stays flat however much history a clinic has. Exports
+run in id order and can be split into chunks (limit + after) so each
+response finishes inside a serverless time limit.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from models import db, Patient, Consultation, Prescription, Medicine
+
+YIELD_PER = 1000
+CSV_FLUSH_ROWS = 500
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+PATIENT_COLUMNS = [
+    Patient.id, Patient.patient_id, Patient.name, Patient.age, Patient.gender,
+    Patient.date_of_birth, Patient.blood_group, Patient.phone, Patient.email, Patient.address,
+    Patient.allergies, Patient.chronic_conditions, Patient.emergency_contact,
+    Patient.emergency_phone, Patient.registration_date, Patient.last_visit
+]
+# Demographics repeated on consultation/prescription rows
+PATIENT_DEMOGRAPHICS = [
+    Patient.patient_id.label('patient_code'), Patient.name.label('patient_name'),
+    Patient.age.label('patient_age'), Patient.gender.label('patient_gender'),
+    Patient.phone.label('patient_phone')
+]
+CONSULTATION_COLUMNS = [
+    Consultation.id, Consultation.consultation_date, *PATIENT_DEMOGRAPHICS,
+    Consultation.bp_systolic, Consultation.bp_diastolic, Consultation.pulse, Consultation.temperature,
+    Consultation.weight, Consultation.height, Consultation.chief_complaint, Consultation.symptoms,
+    Consultation.diagnosis, Consultation.investigation, Consultation.treatment_plan,
+    Consultation.follow_up_date, Consultation.follow_up_notes, Consultation.consultation_fee,
+    Consultation.medicine_charges, Consultation.total_amount, Consultation.payment_status,
+    Consultation.payment_method
+]
+PRESCRIPTION_COLUMNS = [
+    Prescription.id, Prescription.prescription_number, Prescription.created_at,
+    Prescription.consultation_id, *PATIENT_DEMOGRAPHICS, Prescription.diagnosis, Prescription.notes,
+    Prescription.diagnostic_tests, Prescription.referral_to, Prescription.referral_reason,
+    Prescription.follow_up_date, Prescription.follow_up_notes
+]
+MEDICINE_COLUMNS = [
+    Medicine.name.label('medicine_name'), Medicine.dosage.label('medicine_dosage'),
+    Medicine.frequency.label('medicine_frequency'), Medicine.duration.label('medicine_duration'),
+    Medicine.timing.label('medicine_timing'), Medicine.instructions.label('medicine_instructions')
+]
+MEDICINE_KEYS = [column.key[len('medicine_'):] for column in MEDICINE_COLUMNS]
+
+
+class Dataset:
+    """One exportable table: its model, date column and selected columns"""
+
+    def __init__(self, model, date_column, columns, joins=()):
+        self.model = model
+        self.date_column = date_column
+        self.columns = columns
+        self.joins = joins
+
+    def filtered(self, stmt, clinic_id, start=None, end=None):
+        stmt = stmt.where(self.model.clinic_id == clinic_id)
+        if start:
+            stmt = stmt.where(self.date_column >= datetime.combine(start, time.min))
+        if end:
+            # End date is inclusive
+            stmt = stmt.where(self.date_column < datetime.combine(end + timedelta(days=1), time.min))
+        return stmt
+
+    def select(self):
+        stmt = db.select(*self.columns).select_from(self.model)
+        for target, onclause in self.joins:
+            stmt = stmt.join(target, onclause)
+        return stmt
+
+
+DATASETS = {
+    'patients': Dataset(Patient, Patient.registration_date, PATIENT_COLUMNS),
+    'consultations': Dataset(Consultation, Consultation.consultation_date, CONSULTATION_COLUMNS,
+                             joins=[(Patient, Consultation.patient_id == Patient.id)]),
+    'prescriptions': Dataset(Prescription, Prescription.created_at, PRESCRIPTION_COLUMNS,
+                             joins=[(Patient, Prescription.patient_id == Patient.id)]),
+}
+
+
+def column_names(dataset):
+    """CSV header for a dataset (prescriptions get one row per medicine)"""
+    names = [column.key for column in DATASETS[dataset].columns]
+    if dataset == 'prescriptions':
+        names += [column.key for column in MEDICINE_COLUMNS]
+    return names
+
+
+def chunk_bounds(dataset, clinic_id, start=None, end=None, after=None, limit=None):
+    """
+    Id range for one export chunk: returns (last_id, has_more). With no
+    limit the chunk runs to the end. Counts records (prescriptions, not
+    medicine lines), using the primary key index only.
+    """
+    if not limit:
+        return None, False
+    spec = DATASETS[dataset]
+    stmt = spec.filtered(db.select(spec.model.id), clinic_id, start, end)
+    if after:
+        stmt = stmt.where(spec.model.id > after)
+    ids = db.session.execute(stmt.order_by(spec.model.id).offset(limit - 1).limit(2)).scalars().all()
+    if not ids:
+        return None, False
+    return ids[0], len(ids) > 1
+
+
+def iter_records(dataset, clinic_id, start=None, end=None, after=None, last_id=None):
+    """Yield export records as dicts, oldest id first, from a server-side cursor"""
+    spec = DATASETS[dataset]
+    stmt = spec.filtered(spec.select(), clinic_id, start, end)
+    if after:
+        stmt = stmt.where(spec.model.id > after)
+    if last_id:
+        stmt = stmt.where(spec.model.id <= last_id)
+
+    if dataset != 'prescriptions':
+        stmt = stmt.order_by(spec.model.id).execution_options(yield_per=YIELD_PER)
+        for row in db.session.execute(stmt):
+            yield row._asdict()
+        return
+
+    # One row per medicine; regroup consecutive rows into one record
+    stmt = stmt.add_columns(*MEDICINE_COLUMNS).outerjoin(Medicine, Medicine.prescription_id == Prescription.id)
+    stmt = stmt.order_by(Prescription.id, Medicine.order, Medicine.id).execution_options(yield_per=YIELD_PER)
+    current = None
+    for row in db.session.execute(stmt):
+        values = row._asdict()
+        medicine = {key: values.pop(f'medicine_{key}') for key in MEDICINE_KEYS}
+        if current is None or current['id'] != values['id']:
+            if current is not None:
+                yield current
+            current = dict(values, medicines=[])
+        if medicine['name'] is not None:
+            current['medicines'].append(medicine)
+    if current is not None:
+        yield current
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def to_ndjson(records):
+    for record in records:
+        yield json.dumps(record, default=_json_default) + '\n'
+
+
+def to_csv(dataset, records):
+    """CSV text chunks; prescriptions are flattened to one line per medicine"""
+    header = column_names(dataset)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 0
+    for record in records:
+        medicines = record.pop('medicines', None)
+        base = [_csv_value(value) for value in record.values()]
+        if medicines is None:
+            writer.writerow(base)
+        else:
+            for medicine in medicines or [dict.fromkeys(MEDICINE_KEYS)]:
+                writer.writerow(base + [medicine[key] for key in MEDICINE_KEYS])
+        pending += 1
+        if pending >= CSV_FLUSH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def export_chunks(dataset, fmt, clinic_id, **filters):
+    """Text chunks for one export in the requested format"""
+    records = iter_records(dataset, clinic_id, **filters)
+    return to_csv(dataset, records) if fmt == 'csv' else to_ndjson(records)
@@ -0,0 +1,86 @@
+"""
+Engine / connection-pool profiles
+Pick with DB_POOL_PROFILE:
+  serverless   - Vercel lambdas -> Supabase pooler: no pool, no prepared statements
+  worker       - long-running gunicorn workers: sized QueuePool, pre-ping, recycle
+  sqlite-local - local SQLite file: WAL journal, busy timeout
+Defaults to serverless on Vercel, sqlite-local for SQLite URLs, worker otherwise.
+"""
+import os
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+
+PROFILES = ('serverless', 'worker', 'sqlite-local')
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def default_profile(database_uri):
+    if database_uri.startswith('sqlite'):
+        return 'sqlite-local'
+    if os.environ.get('VERCEL'):
+        return 'serverless'
+    return 'worker'
+
+
+def _postgres_connect_args(database_uri, statement_timeout_ms):
+    connect_args = {'connect_timeout': _env_int('DB_CONNECT_TIMEOUT', 5)}
+    if statement_timeout_ms:
+        # Set at connection startup, so it costs no extra round trip. If the
+        # pooler rejects startup options, set DB_STATEMENT_TIMEOUT_MS=0 and use
+        # ALTER ROLE ... SET statement_timeout instead.
+        connect_args['options'] = f'-c statement_timeout={statement_timeout_ms}'
+    if database_uri.startswith('postgresql+psycopg:'):
+        # psycopg 3 prepares repeated statements server-side, which breaks
+        # behind transaction-mode PgBouncer (psycopg2 never prepares)
+        connect_args['prepare_threshold'] = None
+    return connect_args
+
+
+def engine_options(profile, database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for a profile"""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DB_POOL_PROFILE {profile!r} (expected one of {', '.join(PROFILES)})")
+
+    if profile == 'sqlite-local':
+        return {
+            'connect_args': {
+                'timeout': _env_int('DB_BUSY_TIMEOUT_MS', 5000) / 1000,
+                'check_same_thread': False
+            }
+        }
+
+    if profile == 'serverless':
+        # Each lambda handles one request at a time and may be frozen between
+        # requests; the external pooler does the pooling
+        return {
+            'poolclass': NullPool,
+            'connect_args': _postgres_connect_args(database_uri, _env_int('DB_STATEMENT_TIMEOUT_MS', 10000))
+        }
+
+    return {
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 5),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 300),
+        'pool_pre_ping': True,
+        'connect_args': _postgres_connect_args(database_uri, _env_int('DB_STATEMENT_TIMEOUT_MS', 15000))
+    }
+
+
+def install_engine_hooks(engine, profile):
+    """Per-connection setup that can't be expressed as engine options"""
+    if profile != 'sqlite-local' or engine.dialect.name != 'sqlite':
+        return
+
+    busy_timeout = _env_int('DB_BUSY_TIMEOUT_MS', 5000)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')  # Readers don't block the writer
+        cursor.execute('PRAGMA synchronous=NORMAL')  # Safe with WAL, far fewer fsyncs
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout}')
+        cursor.close()
@@ -0,0 +1,64 @@
+"""
+Read-replica routing
+With DATABASE_REPLICA_URL set, the replica is the 'replica' bind and
+SELECTs made while serving GET/HEAD requests read from it. Everything else
+stays on the primary:
+- non-GET requests, CLI commands and background jobs
+- writes, raw SQL, and any statement after the request's first write
+- requests from a browser, or for a clinic, that wrote within
+  REPLICA_STICKY_SECONDS, so the redirect after a POST (and caches refilled
+  after it) see the write despite replication lag
+"""
+import time
+from flask import g, request, session, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import Select, CompoundSelect
+
+REPLICA_BIND = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+STICKY_KEY = 'primary_until'
+
+# clinic id -> time until which this worker reads that clinic from the primary
+_clinic_writes = {}
+
+
+class RoutingSession(Session):
+    """Session that sends plain SELECTs to the replica when the request allows it"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # clause is None for dialect lookups (get_bind()), which stay neutral
+        if bind is None and has_request_context() and (clause is not None or self._flushing):
+            if self._flushing or not isinstance(clause, (Select, CompoundSelect)):
+                # A write (or unrecognised statement): primary from here on
+                g.db_replica = False
+                g.db_wrote = True
+            elif g.get('db_replica'):
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _sticky(now):
+    until = session.get(STICKY_KEY)
+    if until and until < now:
+        session.pop(STICKY_KEY)
+        until = None
+    return bool(until) or _clinic_writes.get(session.get('clinic_id'), 0) > now
+
+
+def init_replica(app):
+    """Route eligible reads to the replica bind, if one is configured"""
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    @app.before_request
+    def choose_database():
+        g.db_replica = request.method in READ_METHODS and not _sticky(time.time())
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method not in READ_METHODS or g.get('db_wrote'):
+            until = time.time() + app.config['REPLICA_STICKY_SECONDS']
+            session[STICKY_KEY] = until
+            if session.get('clinic_id'):
+                _clinic_writes[session['clinic_id']] = until
+        return response
@@ -0,0 +1,121 @@
+"""
+Conditional GET and rendered-page cache for read-mostly views
+A view passes the version of everything its page shows (row updated_at
+timestamps and the like). Browsers that already hold that version get a
+304 without any rendering; otherwise the HTML may come from a small
+per-process cache keyed on the same version, and only a miss renders.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+from flask import request, session, current_app, make_response
+
+
+def _code_version():
+    """Hash of the templates and app modules: identical in every worker running the same code"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha1()
+    paths = [os.path.join(root, name) for name in os.listdir(root) if name.endswith('.py')]
+    for folder, _, files in os.walk(os.path.join(root, 'templates')):
+        paths.extend(os.path.join(folder, name) for name in files)
+    for path in sorted(paths):
+        digest.update(os.path.relpath(path, root).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def _render_version():
+    """
+    Changes on every deploy, so template edits never revalidate against
+    pages rendered by older code, and is the same in every worker so a 304
+    doesn't depend on which worker answers. Process start time is the dev
+    fallback only.
+    """
+    version = os.environ.get('APP_VERSION') or os.environ.get('VERCEL_GIT_COMMIT_SHA')
+    if version:
+        return version
+    try:
+        return _code_version()
+    except OSError:
+        return str(time.time())
+
+
+RENDER_VERSION = _render_version()
+
+
+class RenderCache:
+    """Thread-safe LRU of rendered HTML keyed by (endpoint, ETag)"""
+
+    def __init__(self):
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._pages.get(key)
+            if html is not None:
+                self._pages.move_to_end(key)
+            return html
+
+    def put(self, key, html, max_entries):
+        with self._lock:
+            self._pages[key] = html
+            self._pages.move_to_end(key)
+            while len(self._pages) > max_entries:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+render_cache = RenderCache()
+
+
+def page_etag(*versions):
+    """ETag for a page built from `versions` (plus the deploy and the logged-in clinic)"""
+    parts = (RENDER_VERSION, session.get('clinic_id'), session.get('clinic_name'), session.get('doctor_name')) + versions
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def _is_fresh(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)  # takes precedence over dates
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    return False
+
+
+def _with_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Patient data: browser may keep a copy but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def conditional_page(etag, last_modified, render):
+    """
+    Respond with 304 if the client's copy matches `etag`, else the cached
+    or freshly rendered page. `render` is only called on a cache miss.
+    Pages with pending flash messages are always rendered and never cached.
+    """
+    if '_flashes' in session:
+        return render()
+
+    if _is_fresh(etag, last_modified):
+        return _with_validators(make_response('', 304), etag, last_modified)
+
+    max_entries = current_app.config.get('RENDER_CACHE_SIZE', 0)
+    key = (request.endpoint, etag)
+    html = render_cache.get(key) if max_entries else None
+    if html is None:
+        html = render()
+        if max_entries:
+            render_cache.put(key, html, max_entries)
+    return _with_validators(make_response(html), etag, last_modified)
@@ -0,0 +1,129 @@
+"""
+Database-backed background jobs
+Jobs live in the `jobs` table (models.Job), so they survive restarts and
+need no external broker. A worker claims due jobs in batches, hands each
+kind's batch to its handler in one call, and retries failures with
+exponential backoff until max_attempts.
+
+Run a worker with `flask --app app run-jobs`, or on serverless hosts let
+a cron hit POST /internal/jobs/run (Bearer JOBS_TOKEN) to drain one round.
+"""
+import json
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from flask import current_app, request, jsonify
+import click
+from models import db, Job
+
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 6 * 3600
+STALE_AFTER = timedelta(minutes=15)  # a running job older than this belongs to a dead worker
+
+# kind -> handler(list of (job id, payload)) -> {job id: error message} for failures
+_handlers = {}
+
+
+def job_handler(kind):
+    """Register a batch handler for `kind`"""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts` (60s, 2m, 4m, ... capped at 6h)"""
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_batch(limit=50, worker=None):
+    """
+    Claim and run one batch of due jobs. Returns {'claimed', 'done',
+    'retried', 'failed'} counts. Handler exceptions fail the whole kind's
+    batch; per-job errors returned by the handler fail just those jobs.
+    """
+    jobs = Job.claim(worker or worker_name(), limit, STALE_AFTER)
+    db.session.commit()
+    counts = {'claimed': len(jobs), 'done': 0, 'retried': 0, 'failed': 0}
+
+    by_kind = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+
+    for kind, batch in by_kind.items():
+        handler = _handlers.get(kind)
+        if handler is None:
+            errors = {job.id: f'No handler for job kind {kind!r}' for job in batch}
+        else:
+            try:
+                errors = handler([(job.id, json.loads(job.payload)) for job in batch]) or {}
+            except Exception as e:
+                db.session.rollback()
+                errors = {job.id: f'{type(e).__name__}: {e}' for job in batch}
+
+        now = datetime.utcnow()
+        for job in batch:
+            job.locked_by = None
+            job.locked_at = None
+            if job.id not in errors:
+                job.status = 'done'
+                job.finished_at = now
+                job.last_error = None
+                counts['done'] += 1
+            elif job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.finished_at = now
+                job.last_error = errors[job.id]
+                counts['failed'] += 1
+            else:
+                job.status = 'pending'
+                job.run_at = now + backoff(job.attempts)
+                job.last_error = errors[job.id]
+                counts['retried'] += 1
+        db.session.commit()
+    return counts
+
+
+def run_until_idle(limit=50, max_seconds=None):
+    """Run batches until nothing is due (or max_seconds passes). Returns summed counts."""
+    started = time.monotonic()
+    totals = {'claimed': 0, 'done': 0, 'retried': 0, 'failed': 0}
+    while True:
+        counts = run_batch(limit)
+        for key, value in counts.items():
+            totals[key] += value
+        if not counts['claimed'] or (max_seconds and time.monotonic() - started > max_seconds):
+            return totals
+
+
+def init_jobs(app):
+    """Register the run-jobs CLI worker and the cron endpoint"""
+
+    @app.cli.command('run-jobs')
+    @click.option('--once', is_flag=True, help='Drain due jobs once and exit (for cron)')
+    @click.option('--batch-size', type=int, default=50)
+    @click.option('--poll', type=float, default=5.0, help='Seconds to sleep when idle')
+    def run_jobs_command(once, batch_size, poll):
+        """Process background jobs (reminders and other deferred work)"""
+        print(f"🔄 Job worker {worker_name()} started")
+        while True:
+            totals = run_until_idle(batch_size)
+            if totals['claimed']:
+                print(f"✅ Jobs: {totals['done']} done, {totals['retried']} retrying, {totals['failed']} failed")
+            if once:
+                return
+            time.sleep(poll)
+
+    @app.route('/internal/jobs/run', methods=['POST'])
+    def run_jobs_endpoint():
+        """Drain due jobs for up to JOBS_RUN_SECONDS (cron on serverless; requires JOBS_TOKEN)"""
+        token = current_app.config.get('JOBS_TOKEN')
+        if not token or request.headers.get('Authorization') != f'Bearer {token}':
+            return jsonify({'error': 'Unauthorized'}), 401
+        return jsonify(run_until_idle(max_seconds=current_app.config.get('JOBS_RUN_SECONDS', 20)))
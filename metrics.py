@@ -0,0 +1,168 @@
+"""
+Per-route request instrumentation
+Latency histograms, SQL statement count/time, template render time and
+response size per Flask endpoint, exported in Prometheus text format.
+Numbers are per worker process.
+"""
+import threading
+import time
+from flask import g, request, current_app, has_request_context, Response, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from query_budget import query_count
+
+# Histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EndpointStats:
+    """Running totals for one endpoint"""
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency = 0.0
+        self.sql_queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.response_bytes = 0
+        self.statuses = {}
+
+    def observe(self, latency, sql_queries, sql_time, render_time, response_bytes, status):
+        self.count += 1
+        self.latency += latency
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[i] += 1
+        self.sql_queries += sql_queries
+        self.sql_time += sql_time
+        self.render_time += render_time
+        self.response_bytes += response_bytes
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+class Metrics:
+    """Thread-safe registry of EndpointStats keyed by endpoint name"""
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, **values):
+        with self._lock:
+            self.endpoints.setdefault(endpoint, EndpointStats()).observe(**values)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self._lock:
+            snapshot = sorted(self.endpoints.items())
+            lines = [
+                '# HELP clinicmate_request_duration_seconds Request latency by endpoint',
+                '# TYPE clinicmate_request_duration_seconds histogram',
+            ]
+            for endpoint, stats in snapshot:
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    lines.append(f'clinicmate_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'clinicmate_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {stats.count}')
+                lines.append(f'clinicmate_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats.latency:.6f}')
+                lines.append(f'clinicmate_request_duration_seconds_count{{endpoint="{endpoint}"}} {stats.count}')
+
+            lines += ['# HELP clinicmate_requests_total Requests by endpoint and status',
+                      '# TYPE clinicmate_requests_total counter']
+            for endpoint, stats in snapshot:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'clinicmate_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+            counters = [
+                ('clinicmate_sql_queries_total', 'SQL statements executed', 'sql_queries', '{}'),
+                ('clinicmate_sql_duration_seconds_total', 'Time spent in SQL', 'sql_time', '{:.6f}'),
+                ('clinicmate_template_render_seconds_total', 'Time spent rendering templates', 'render_time', '{:.6f}'),
+                ('clinicmate_response_bytes_total', 'Response body bytes', 'response_bytes', '{}'),
+            ]
+            for name, help_text, attr, fmt in counters:
+                lines += [f'# HELP {name} {help_text} by endpoint', f'# TYPE {name} counter']
+                for endpoint, stats in snapshot:
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} ' + fmt.format(getattr(stats, attr)))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+# ==================== SQL TIMING ====================
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _sql_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _sql_end(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context():
+        g.sql_time = g.get('sql_time', 0.0) + elapsed
+
+
+# ==================== TEMPLATE TIMING ====================
+
+def _render_start(sender, template, context, **extra):
+    g.render_start = time.perf_counter()
+
+
+def _render_end(sender, template, context, **extra):
+    start = g.pop('render_start', None)
+    if start is not None:
+        g.render_time = g.get('render_time', 0.0) + time.perf_counter() - start
+
+
+# ==================== REQUEST HOOKS ====================
+
+def init_metrics(app):
+    """Register request hooks, template signals and the /metrics endpoint"""
+    before_render_template.connect(_render_start, app)
+    template_rendered.connect(_render_end, app)
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('request_start')
+        if start is None or request.endpoint == 'metrics_endpoint':
+            return response
+
+        latency = time.perf_counter() - start
+        # calculate_content_length() would buffer a streamed body; count those as 0
+        response_bytes = (response.content_length if response.is_streamed else response.calculate_content_length()) or 0
+        sql_time = g.get('sql_time', 0.0)
+        render_time = g.get('render_time', 0.0)
+        metrics.observe(
+            request.endpoint or 'unknown',
+            latency=latency,
+            sql_queries=query_count(),
+            sql_time=sql_time,
+            render_time=render_time,
+            response_bytes=response_bytes,
+            status=response.status_code
+        )
+
+        if current_app.config.get('METRICS_SERVER_TIMING'):
+            response.headers['Server-Timing'] = (
+                f'db;desc="{query_count()} queries";dur={sql_time * 1000:.1f}, '
+                f'render;dur={render_time * 1000:.1f}, '
+                f'total;dur={latency * 1000:.1f}'
+            )
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Prometheus scrape endpoint (requires METRICS_TOKEN as a bearer token when set)"""
+        token = current_app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
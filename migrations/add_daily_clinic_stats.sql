@@ -0,0 +1,19 @@
+-- Migration: Daily Clinic Stats Rollup
+-- Date: 2026-10-17
+-- Description: Per-clinic daily counters read by the dashboard instead of scanning consultations
+-- After running this, backfill from history with:  flask --app app rebuild-daily-stats
+
+CREATE TABLE IF NOT EXISTS daily_clinic_stats (
+    clinic_id INTEGER NOT NULL REFERENCES clinics(id) ON DELETE CASCADE,
+    stat_date DATE NOT NULL,
+    consultations INTEGER NOT NULL DEFAULT 0,
+    collection DOUBLE PRECISION NOT NULL DEFAULT 0,
+    new_patients INTEGER NOT NULL DEFAULT 0,
+    patients_total INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (clinic_id, stat_date)
+);
+
+COMMENT ON TABLE daily_clinic_stats IS 'Dashboard rollup: consultations, collection and patient counts per clinic per day';
+COMMENT ON COLUMN daily_clinic_stats.patients_total IS 'Registered patients as of the end of stat_date';
+
+-- Migration completed successfully
@@ -0,0 +1,25 @@
+-- Migration: Hot Path Indexes
+-- Date: 2026-10-17
+-- Description: Composite indexes now declared in models.py for clinic date ranges and appointment/consultation lookups
+-- Check plans afterwards with: python benchmarks/query_plans.py
+
+-- ====================
+-- 1. CONSULTATIONS
+-- ====================
+
+-- Already present if add_admin_features.sql was applied
+CREATE INDEX IF NOT EXISTS idx_consultations_clinic_date ON consultations (clinic_id, consultation_date);
+CREATE INDEX IF NOT EXISTS idx_consultations_appointment_id ON consultations (appointment_id);
+
+-- ====================
+-- 2. PRESCRIPTIONS
+-- ====================
+
+CREATE INDEX IF NOT EXISTS idx_prescriptions_clinic_created ON prescriptions (clinic_id, created_at);
+-- Already present if add_prescription_tables.sql was applied
+CREATE INDEX IF NOT EXISTS idx_prescriptions_consultation_id ON prescriptions (consultation_id);
+
+-- Superseded by idx_prescriptions_clinic_created
+DROP INDEX IF EXISTS idx_prescriptions_clinic_id;
+
+-- Migration completed successfully
@@ -0,0 +1,51 @@
+-- Migration: Counter-based Patient ID / Prescription Number Allocation
+-- Date: 2026-10-17
+-- Description: Adds per-clinic ID counters and makes PAT-/RX- numbers unique per clinic
+
+-- ====================
+-- 1. CREATE COUNTER TABLE
+-- ====================
+
+CREATE TABLE IF NOT EXISTS id_sequences (
+    clinic_id INTEGER NOT NULL REFERENCES clinics(id) ON DELETE CASCADE,
+    name VARCHAR(30) NOT NULL,
+    last_value INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (clinic_id, name)
+);
+
+COMMENT ON TABLE id_sequences IS 'Per-clinic counters for PAT-0001 / RX-0001 style IDs';
+
+-- ====================
+-- 2. SEED COUNTERS FROM EXISTING DATA
+-- ====================
+-- (The app also seeds lazily on first use, so this step is optional)
+
+INSERT INTO id_sequences (clinic_id, name, last_value)
+SELECT clinic_id, 'patient', MAX(CAST(SUBSTRING(patient_id FROM 5) AS INTEGER))
+FROM patients
+WHERE patient_id ~ '^PAT-[0-9]+$'
+GROUP BY clinic_id
+ON CONFLICT (clinic_id, name) DO NOTHING;
+
+INSERT INTO id_sequences (clinic_id, name, last_value)
+SELECT clinic_id, 'prescription', MAX(CAST(SUBSTRING(prescription_number FROM 4) AS INTEGER))
+FROM prescriptions
+WHERE prescription_number ~ '^RX-[0-9]+$'
+GROUP BY clinic_id
+ON CONFLICT (clinic_id, name) DO NOTHING;
+
+-- ====================
+-- 3. MAKE IDS UNIQUE PER CLINIC (NOT GLOBALLY)
+-- ====================
+-- Numbering is per clinic, so a global UNIQUE made every clinic after
+-- the first collide on PAT-0001 / RX-0001
+
+ALTER TABLE patients DROP CONSTRAINT IF EXISTS patients_patient_id_key;
+ALTER TABLE patients DROP CONSTRAINT IF EXISTS unique_patient_id_per_clinic;
+ALTER TABLE patients ADD CONSTRAINT unique_patient_id_per_clinic UNIQUE (clinic_id, patient_id);
+
+ALTER TABLE prescriptions DROP CONSTRAINT IF EXISTS prescriptions_prescription_number_key;
+ALTER TABLE prescriptions DROP CONSTRAINT IF EXISTS unique_prescription_number_per_clinic;
+ALTER TABLE prescriptions ADD CONSTRAINT unique_prescription_number_per_clinic UNIQUE (clinic_id, prescription_number);
+
+-- Migration completed successfully
@@ -0,0 +1,32 @@
+-- Migration: Background Jobs
+-- Date: 2026-10-17
+-- Description: Durable job queue (jobs.py) used for SMS appointment/follow-up reminders
+
+-- ====================
+-- 1. JOBS TABLE
+-- ====================
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id SERIAL PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}',
+    dedupe_key VARCHAR(200) UNIQUE,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(100),
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- ====================
+-- 2. INDEXES
+-- ====================
+
+-- Workers claim pending jobs that are due
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at);
+
+-- Migration completed successfully
@@ -0,0 +1,24 @@
+-- Migration: Decayed Ranking for Medicine/Test Autocomplete
+-- Date: 2026-10-17
+-- Description: Score column (recency/frequency-decayed usage) and per-clinic score indexes
+-- After running this, backfill scores from prescription history with:  flask --app app rebuild-library-scores
+
+-- ====================
+-- 1. SCORE COLUMNS
+-- ====================
+
+ALTER TABLE medicine_master ADD COLUMN IF NOT EXISTS score DOUBLE PRECISION DEFAULT 0;
+ALTER TABLE diagnostic_test_master ADD COLUMN IF NOT EXISTS score DOUBLE PRECISION DEFAULT 0;
+
+COMMENT ON COLUMN medicine_master.score IS 'Sum of 2^(days since 2024-01-01 / 90) over uses; higher = used more and more recently';
+COMMENT ON COLUMN diagnostic_test_master.score IS 'Sum of 2^(days since 2024-01-01 / 90) over uses; higher = used more and more recently';
+
+-- ====================
+-- 2. INDEXES
+-- ====================
+
+-- Top-scoring library entries per clinic (autocomplete index loads)
+CREATE INDEX IF NOT EXISTS idx_medicine_master_clinic_score ON medicine_master (clinic_id, score);
+CREATE INDEX IF NOT EXISTS idx_test_master_clinic_score ON diagnostic_test_master (clinic_id, score);
+
+-- Migration completed successfully
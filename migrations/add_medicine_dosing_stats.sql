@@ -0,0 +1,29 @@
+-- Migration: Medicine Dosing Stats
+-- Date: 2026-10-17
+-- Description: Per-clinic counts of dosage/frequency/duration/timing values per medicine; library defaults become the most used value
+-- After running this, backfill from prescription history with:  flask --app app rebuild-dosing-stats
+
+-- ====================
+-- 1. COUNTERS TABLE
+-- ====================
+
+CREATE TABLE IF NOT EXISTS medicine_dosing_stats (
+    clinic_id INTEGER NOT NULL REFERENCES clinics(id) ON DELETE CASCADE,
+    medicine VARCHAR(200) NOT NULL,
+    field VARCHAR(20) NOT NULL,
+    value VARCHAR(100) NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (clinic_id, medicine, field, value)
+);
+
+COMMENT ON TABLE medicine_dosing_stats IS 'How often each dosing value was prescribed with a medicine (saved lines only)';
+
+-- ====================
+-- 2. LIBRARY SUMMARY
+-- ====================
+
+ALTER TABLE medicine_master ADD COLUMN IF NOT EXISTS dosing_options TEXT;
+
+COMMENT ON COLUMN medicine_master.dosing_options IS 'JSON {field: [{value, uses}]}: top values per field, shown with autocomplete suggestions';
+
+-- Migration completed successfully
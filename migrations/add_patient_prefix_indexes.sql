@@ -0,0 +1,14 @@
+-- Migration: Patient Typeahead Prefix Indexes
+-- Date: 2026-10-17
+-- Description: Btree prefix indexes behind /api/patients/search (appointment booking typeahead)
+-- text_pattern_ops lets LIKE 'term%' use the index regardless of the database collation
+
+-- ====================
+-- 1. PREFIX INDEXES
+-- ====================
+
+CREATE INDEX IF NOT EXISTS idx_patients_name_prefix ON patients (clinic_id, lower(name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_patients_phone_prefix ON patients (clinic_id, phone text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_patients_patient_id_prefix ON patients (clinic_id, lower(patient_id) text_pattern_ops);
+
+-- Migration completed successfully
@@ -0,0 +1,21 @@
+-- Migration: Indexed Patient Search
+-- Date: 2026-10-17
+-- Description: Trigram GIN indexes so the patients search (substring + fuzzy) uses an index
+-- The app checks for pg_trgm at startup and falls back to plain ILIKE without it
+
+-- ====================
+-- 1. ENABLE TRIGRAM EXTENSION
+-- ====================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- ====================
+-- 2. TRIGRAM INDEXES
+-- ====================
+-- Serve LIKE '%term%' on lower(...) and the similarity operator (lower(name) % term)
+
+CREATE INDEX IF NOT EXISTS idx_patients_name_trgm ON patients USING gin (lower(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_patients_phone_trgm ON patients USING gin (lower(phone) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_patients_patient_id_trgm ON patients USING gin (lower(patient_id) gin_trgm_ops);
+
+-- Migration completed successfully
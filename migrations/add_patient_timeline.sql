@@ -0,0 +1,25 @@
+-- Migration: Patient Timeline
+-- Date: 2026-10-17
+-- Description: Visit/prescription counters on patients and per-patient date indexes behind /api/patients/<id>/timeline
+
+-- ====================
+-- 1. PATIENT COUNTERS
+-- ====================
+
+ALTER TABLE patients ADD COLUMN IF NOT EXISTS visit_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE patients ADD COLUMN IF NOT EXISTS prescription_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill (same as: flask --app app rebuild-patient-counters)
+UPDATE patients SET
+    visit_count = (SELECT COUNT(*) FROM consultations c WHERE c.patient_id = patients.id),
+    prescription_count = (SELECT COUNT(*) FROM prescriptions p WHERE p.patient_id = patients.id);
+
+-- ====================
+-- 2. TIMELINE INDEXES
+-- ====================
+
+CREATE INDEX IF NOT EXISTS idx_consultations_patient_date ON consultations (patient_id, consultation_date);
+CREATE INDEX IF NOT EXISTS idx_prescriptions_patient_created ON prescriptions (patient_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_appointments_patient_date ON appointments (patient_id, appointment_date);
+
+-- Migration completed successfully
@@ -5,8 +5,68 @@ Simple prototype with essential features
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, date
 import hashlib
+import json
+import re
+from db_replica import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Bump whenever a model/table is added or changed, so deployments with
+# SCHEMA_CHECK=auto run create_all() once instead of on every cold start
+SCHEMA_VERSION = 9
+
+
+def upsert_insert(model):
+    """
+    Dialect-specific INSERT for `model` that supports on_conflict_do_update
+    (PostgreSQL in production, SQLite locally)
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+# Library ranking: each use adds a weight that doubles every half-life, so
+# comparing stored scores equals comparing exponentially decayed usage
+# (an old use counts half as much per half-life) and scores never have to be
+# re-decayed. Changing either constant requires `flask rebuild-library-scores`.
+SCORE_EPOCH = datetime(2024, 1, 1)
+SCORE_HALF_LIFE_DAYS = 90
+
+
+def usage_score(when=None):
+    """Score contributed by one use at `when` (default now)"""
+    age = ((when or datetime.utcnow()) - SCORE_EPOCH).total_seconds()
+    return 2.0 ** (age / (SCORE_HALF_LIFE_DAYS * 86400))
+
+
+def diagnostic_test_names(diagnostic_tests):
+    """Test names from a prescription's newline/comma separated diagnostic_tests"""
+    return [name.strip() for name in re.split(r'[\n,]+', diagnostic_tests or '') if name.strip()]
+
+
+def _apply_library_scores(model, history, clinic_id=None):
+    """
+    Set `score` on every library row of `model` from `history`
+    {(clinic_id, name): (score, uses)}. Uses recorded outside that history
+    (usage_count beyond it) count at last_used. Returns rows updated.
+    """
+    query = db.select(model.id, model.clinic_id, model.name, model.usage_count, model.last_used, model.created_at)
+    if clinic_id is not None:
+        query = query.where(model.clinic_id == clinic_id)
+    rows = []
+    for row in db.session.execute(query).all():
+        score, count = history.get((row.clinic_id, row.name), (0.0, 0))
+        extra = max((row.usage_count or 0) - count, 0)
+        if extra:
+            score += extra * usage_score(row.last_used or row.created_at)
+        rows.append({'id': row.id, 'score': score})
+    if rows:
+        db.session.execute(db.update(model), rows)
+    return len(rows)
 
-db = SQLAlchemy()
 
 class Clinic(db.Model):
     """Clinic/Doctor account (like tenant in BizBooks)"""
@@ -66,7 +126,7 @@ class Patient(db.Model):
     clinic_id = db.Column(db.Integer, db.ForeignKey('clinics.id'), nullable=False)
     
     # Demographics
-    patient_id = db.Column(db.String(50), unique=True)  # e.g., PAT-0001
+    patient_id = db.Column(db.String(50))  # e.g., PAT-0001 (unique per clinic)
     name = db.Column(db.String(100), nullable=False)
     age = db.Column(db.Integer)
     gender = db.Column(db.String(10))  # Male, Female, Other
@@ -88,57 +148,58 @@ class Patient(db.Model):
     registration_date = db.Column(db.DateTime, default=datetime.utcnow)
     last_visit = db.Column(db.DateTime)
     
+    # Denormalized counters for the patient page (kept by the create/delete routes)
+    visit_count = db.Column(db.Integer, nullable=False, default=0)  # consultations
+    prescription_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Match quality, only loaded by patient search (see patient_search.py)
+    search_rank = db.query_expression()
+    
     # Relationships
     appointments = db.relationship('Appointment', backref='patient', lazy=True)
     consultations = db.relationship('Consultation', backref='patient', lazy=True)
     
+    # Patient IDs are numbered per clinic
+    __table_args__ = (
+        db.UniqueConstraint('clinic_id', 'patient_id', name='unique_patient_id_per_clinic'),
+    )
+    
     @staticmethod
-    def generate_patient_id(clinic_id):
+    def generate_patient_ids(clinic_id, count):
         """
-        Generate unique patient ID for a clinic
+        Allocate `count` consecutive patient IDs for a clinic in one step
         Format: PAT-0001, PAT-0002, etc.
-        Handles gaps from deleted patients and ensures uniqueness
         """
-        # Get all existing patient IDs for this clinic
-        existing_patients = Patient.query.filter_by(clinic_id=clinic_id).all()
-        existing_ids = {p.patient_id for p in existing_patients if p.patient_id}
-        
-        # DEBUG: Print what we found
-        print(f"🔍 DEBUG: Clinic ID: {clinic_id}")
-        print(f"🔍 DEBUG: Found {len(existing_patients)} existing patients")
-        print(f"🔍 DEBUG: Existing IDs: {existing_ids}")
-        
-        # Find the highest number currently in use
-        max_num = 0
-        for patient_id in existing_ids:
-            try:
-                num = int(patient_id.split('-')[1])
-                max_num = max(max_num, num)
-            except (IndexError, ValueError):
-                continue
-        
-        print(f"🔍 DEBUG: Max number found: {max_num}")
-        
-        # Generate new IDs starting from max_num + 1
-        # Keep trying until we find one that doesn't exist (handles edge cases)
-        attempt = 0
-        while attempt < 10000:  # Safety limit
-            new_num = max_num + 1 + attempt
-            new_id = f"PAT-{new_num:04d}"
-            
-            # Check if this ID already exists
-            if new_id not in existing_ids:
-                print(f"✅ DEBUG: Generated new ID: {new_id}")
-                return new_id
-            
-            print(f"⚠️ DEBUG: ID {new_id} already exists, trying next...")
-            attempt += 1
-        
-        # Fallback: use timestamp-based ID (should never reach here)
-        import time
-        fallback_id = f"PAT-{int(time.time()) % 100000:05d}"
-        print(f"⚠️ DEBUG: Using fallback ID: {fallback_id}")
-        return fallback_id
+        first = IdSequence.allocate(clinic_id, 'patient', count, 'PAT-', Patient.patient_id)
+        return [f"PAT-{num:04d}" for num in range(first, first + count)]
+    
+    @staticmethod
+    def generate_patient_id(clinic_id):
+        """Allocate the next patient ID for a clinic (caller commits)"""
+        return Patient.generate_patient_ids(clinic_id, 1)[0]
+    
+    @staticmethod
+    def rebuild_counters(clinic_id=None):
+        """Recount visits and prescriptions for every patient (or one clinic's). Caller commits."""
+        visits = db.select(db.func.count(Consultation.id)).where(Consultation.patient_id == Patient.id)
+        prescriptions = db.select(db.func.count(Prescription.id)).where(Prescription.patient_id == Patient.id)
+        stmt = db.update(Patient).values(
+            visit_count=visits.scalar_subquery(),
+            prescription_count=prescriptions.scalar_subquery()
+        )
+        if clinic_id is not None:
+            stmt = stmt.where(Patient.clinic_id == clinic_id)
+        return db.session.execute(stmt.execution_options(synchronize_session=False)).rowcount
+
+
+# Prefix indexes for the patient typeahead (patient_search.py). On PostgreSQL
+# text_pattern_ops lets LIKE 'term%' use them under any collation.
+db.Index('idx_patients_name_prefix', Patient.clinic_id, db.func.lower(Patient.name).label('name_lower'),
+         postgresql_ops={'name_lower': 'text_pattern_ops'})
+db.Index('idx_patients_phone_prefix', Patient.clinic_id, Patient.phone,
+         postgresql_ops={'phone': 'text_pattern_ops'})
+db.Index('idx_patients_patient_id_prefix', Patient.clinic_id, db.func.lower(Patient.patient_id).label('patient_id_lower'),
+         postgresql_ops={'patient_id_lower': 'text_pattern_ops'})
 
 
 class Appointment(db.Model):
@@ -167,6 +228,12 @@ class Appointment(db.Model):
     
     # Relationships
     consultation = db.relationship('Consultation', backref='appointment', uselist=False)
+    
+    # Day views and slot conflict checks (slots.py)
+    __table_args__ = (
+        db.Index('idx_appointments_clinic_date', 'clinic_id', 'appointment_date', 'appointment_time'),
+        db.Index('idx_appointments_patient_date', 'patient_id', 'appointment_date'),
+    )
 
 
 class Consultation(db.Model):
@@ -211,6 +278,14 @@ class Consultation(db.Model):
     # Relationships
     clinic = db.relationship('Clinic', backref='consultations')
     prescriptions = db.relationship('Prescription', backref='consultation', lazy=True)
+    
+    # Patient timeline (patient_timeline.py), clinic date ranges (analytics,
+    # exports) and the appointment -> consultation lookup on appointment lists
+    __table_args__ = (
+        db.Index('idx_consultations_patient_date', 'patient_id', 'consultation_date'),
+        db.Index('idx_consultations_clinic_date', 'clinic_id', 'consultation_date'),
+        db.Index('idx_consultations_appointment_id', 'appointment_id'),
+    )
 
 
 class Prescription(db.Model):
@@ -223,7 +298,7 @@ class Prescription(db.Model):
     consultation_id = db.Column(db.Integer, db.ForeignKey('consultations.id'))
     
     # Prescription details
-    prescription_number = db.Column(db.String(50), unique=True)  # e.g., RX-0001
+    prescription_number = db.Column(db.String(50))  # e.g., RX-0001 (unique per clinic)
     diagnosis = db.Column(db.Text)
     notes = db.Column(db.Text)  # General advice, precautions
     
@@ -247,25 +322,70 @@ class Prescription(db.Model):
     patient = db.relationship('Patient', backref='prescriptions')
     medicines = db.relationship('Medicine', backref='prescription', lazy=True, cascade='all, delete-orphan')
     
+    # Prescription numbers are numbered per clinic; indexes for the patient
+    # timeline, clinic date ranges (list, analytics, exports) and consultation pages
+    __table_args__ = (
+        db.UniqueConstraint('clinic_id', 'prescription_number', name='unique_prescription_number_per_clinic'),
+        db.Index('idx_prescriptions_patient_created', 'patient_id', 'created_at'),
+        db.Index('idx_prescriptions_clinic_created', 'clinic_id', 'created_at'),
+        db.Index('idx_prescriptions_consultation_id', 'consultation_id'),
+    )
+    
     @staticmethod
     def generate_prescription_number(clinic_id):
-        """Generate unique prescription number for a clinic"""
-        # Get all existing prescription numbers for this clinic
-        existing = Prescription.query.filter_by(clinic_id=clinic_id).all()
-        existing_ids = {p.prescription_number for p in existing if p.prescription_number}
+        """Allocate the next prescription number for a clinic (caller commits)"""
+        num = IdSequence.allocate(clinic_id, 'prescription', 1, 'RX-', Prescription.prescription_number)
+        return f"RX-{num:04d}"
+    
+    def sync_medicines(self, submitted):
+        """
+        Bring this prescription's medicine rows in line with `submitted` (dicts
+        of Medicine.FIELDS, in display order), touching only rows that differ:
+        rows with identical content keep their ID, changed lines reuse a
+        leftover row in place, and only surplus rows are inserted or deleted.
+        All of it is flushed as one batch. Returns (added, removed): the
+        submitted entries that were added or changed, and the previous values
+        of lines that were changed or deleted. Caller commits.
+        """
+        def content(values):
+            return tuple(values.get(field) or None for field in Medicine.FIELDS)
         
-        # Find the highest number
-        max_num = 0
-        for rx_id in existing_ids:
-            try:
-                num = int(rx_id.split('-')[1])
-                max_num = max(max_num, num)
-            except (IndexError, ValueError):
-                continue
+        # Don't flush the caller's pending field edits just to load the lines
+        with db.session.no_autoflush:
+            existing = sorted(self.medicines, key=lambda med: (med.order or 0, med.id))
+        by_content = {}
+        for med in existing:
+            by_content.setdefault(content({f: getattr(med, f) for f in Medicine.FIELDS}), []).append(med)
+        
+        # Unchanged lines keep their rows, wherever they moved to
+        matched = [None] * len(submitted)
+        for i, entry in enumerate(submitted):
+            rows = by_content.get(content(entry))
+            if rows:
+                matched[i] = rows.pop(0)
+        claimed = {id(med) for med in matched if med is not None}
+        leftovers = [med for med in existing if id(med) not in claimed]
         
-        # Generate new number
-        new_num = max_num + 1
-        return f"RX-{new_num:04d}"
+        changed = []
+        removed = [{field: getattr(med, field) for field in Medicine.FIELDS} for med in leftovers]
+        for i, entry in enumerate(submitted):
+            med = matched[i]
+            if med is None:
+                changed.append(entry)
+                if leftovers:
+                    med = leftovers.pop(0)
+                    for field in Medicine.FIELDS:
+                        if (getattr(med, field) or None) != (entry.get(field) or None):
+                            setattr(med, field, entry.get(field))
+                else:
+                    med = Medicine(**{field: entry.get(field) for field in Medicine.FIELDS})
+                    self.medicines.append(med)
+            if med.order != i:
+                med.order = i
+        
+        for med in leftovers:
+            self.medicines.remove(med)  # delete-orphan cascade
+        return changed, removed
 
 
 class Medicine(db.Model):
@@ -283,9 +403,29 @@ class Medicine(db.Model):
     timing = db.Column(db.String(50))  # e.g., Before food, After food, Empty stomach
     instructions = db.Column(db.Text)  # Additional instructions
     
+    # Prescription line content (what an edit compares)
+    FIELDS = ('name', 'dosage', 'frequency', 'duration', 'timing', 'instructions')
+    
     # Metadata
     order = db.Column(db.Integer, default=0)  # For ordering medicines in the prescription
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Serves Prescription.medicine_count and prescription.medicines
+    __table_args__ = (
+        db.Index('idx_medicines_prescription_id', 'prescription_id'),
+    )
+
+
+# Medicine count per prescription as a correlated subquery. Deferred, so list
+# pages opt in with .options(db.undefer(Prescription.medicine_count)) instead
+# of lazy-loading every prescription's .medicines just to count them.
+Prescription.medicine_count = db.column_property(
+    db.select(db.func.count(Medicine.id))
+    .where(Medicine.prescription_id == Prescription.id)
+    .correlate_except(Medicine)
+    .scalar_subquery(),
+    deferred=True
+)
 
 
 class MedicineMaster(db.Model):
@@ -302,11 +442,13 @@ class MedicineMaster(db.Model):
     common_frequency = db.Column(db.String(50))  # Most common frequency
     common_duration = db.Column(db.String(50))  # Most common duration
     common_timing = db.Column(db.String(50))  # Most common timing
+    dosing_options = db.Column(db.Text)  # JSON {field: [{value, uses}]}, top values from MedicineDosingStat
     category = db.Column(db.String(100))  # E.g., Antibiotic, Painkiller, etc.
     
     # Usage tracking
     usage_count = db.Column(db.Integer, default=1)  # How many times prescribed
     last_used = db.Column(db.DateTime, default=datetime.utcnow)
+    score = db.Column(db.Float, default=0)  # Decayed usage, see usage_score()
     
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -317,7 +459,72 @@ class MedicineMaster(db.Model):
     # Unique constraint: one medicine name per clinic
     __table_args__ = (
         db.UniqueConstraint('clinic_id', 'name', name='unique_medicine_per_clinic'),
+        db.Index('idx_medicine_master_clinic_score', 'clinic_id', 'score'),
     )
+    
+    @staticmethod
+    def record_usage(clinic_id, medicines):
+        """
+        Add or update library entries for the medicines on a prescription
+        in a single INSERT ... ON CONFLICT statement.
+        `medicines` is a list of dicts with name, dosage, frequency, duration, timing.
+        The common_* defaults of existing entries are left to
+        MedicineDosingStat.refresh_library(). Returns the updated library rows.
+        Caller commits.
+        """
+        now = datetime.utcnow()
+        weight = usage_score(now)
+        rows = {}
+        for med in medicines:
+            name = (med.get('name') or '').strip()
+            if not name:
+                continue
+            row = rows.setdefault(name, {
+                'clinic_id': clinic_id, 'name': name, 'usage_count': 0, 'score': 0,
+                'common_dosage': None, 'common_frequency': None,
+                'common_duration': None, 'common_timing': None,
+                'last_used': now, 'created_at': now
+            })
+            row['usage_count'] += 1
+            row['score'] += weight
+            # Later lines win, but only when a value was actually entered
+            for field in ('dosage', 'frequency', 'duration', 'timing'):
+                if med.get(field):
+                    row[f'common_{field}'] = med[field]
+        if not rows:
+            return []
+        
+        stmt = upsert_insert(MedicineMaster).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['clinic_id', 'name'],
+            set_={
+                'usage_count': MedicineMaster.usage_count + stmt.excluded.usage_count,
+                'score': db.func.coalesce(MedicineMaster.score, 0) + stmt.excluded.score,
+                'last_used': stmt.excluded.last_used,
+            }
+        ).returning(
+            MedicineMaster.name, MedicineMaster.generic_name, MedicineMaster.common_dosage,
+            MedicineMaster.common_frequency, MedicineMaster.common_duration,
+            MedicineMaster.common_timing, MedicineMaster.usage_count, MedicineMaster.score
+        )
+        return db.session.execute(stmt).all()
+    
+    @staticmethod
+    def rebuild_scores(clinic_id=None):
+        """
+        Recompute scores from prescription history: each prescribed line
+        counts at its prescription's date. Returns rows updated. Caller commits.
+        """
+        lines = db.select(Prescription.clinic_id, Medicine.name, Prescription.created_at).join(
+            Prescription, Prescription.id == Medicine.prescription_id
+        )
+        if clinic_id is not None:
+            lines = lines.where(Prescription.clinic_id == clinic_id)
+        history = {}
+        for cid, name, when in db.session.execute(lines.execution_options(yield_per=1000)):
+            score, count = history.get((cid, name.strip()), (0.0, 0))
+            history[(cid, name.strip())] = (score + usage_score(when), count + 1)
+        return _apply_library_scores(MedicineMaster, history, clinic_id)
 
 
 class DiagnosticTestMaster(db.Model):
@@ -334,6 +541,7 @@ class DiagnosticTestMaster(db.Model):
     # Usage tracking
     usage_count = db.Column(db.Integer, default=1)  # How many times recommended
     last_used = db.Column(db.DateTime, default=datetime.utcnow)
+    score = db.Column(db.Float, default=0)  # Decayed usage, see usage_score()
     
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -344,6 +552,426 @@ class DiagnosticTestMaster(db.Model):
     # Unique constraint: one test name per clinic
     __table_args__ = (
         db.UniqueConstraint('clinic_id', 'name', name='unique_test_per_clinic'),
+        db.Index('idx_test_master_clinic_score', 'clinic_id', 'score'),
     )
+    
+    @staticmethod
+    def record_usage(clinic_id, test_names):
+        """
+        Add or update library entries for the tests on a prescription
+        in a single INSERT ... ON CONFLICT statement.
+        Returns the updated library rows. Caller commits.
+        """
+        now = datetime.utcnow()
+        weight = usage_score(now)
+        rows = {}
+        for name in test_names:
+            name = name.strip()
+            if not name:
+                continue
+            row = rows.setdefault(name, {
+                'clinic_id': clinic_id, 'name': name, 'usage_count': 0, 'score': 0,
+                'last_used': now, 'created_at': now
+            })
+            row['usage_count'] += 1
+            row['score'] += weight
+        if not rows:
+            return []
+        
+        stmt = upsert_insert(DiagnosticTestMaster).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['clinic_id', 'name'],
+            set_={
+                'usage_count': DiagnosticTestMaster.usage_count + stmt.excluded.usage_count,
+                'score': db.func.coalesce(DiagnosticTestMaster.score, 0) + stmt.excluded.score,
+                'last_used': stmt.excluded.last_used,
+            }
+        ).returning(
+            DiagnosticTestMaster.name, DiagnosticTestMaster.category,
+            DiagnosticTestMaster.usage_count, DiagnosticTestMaster.score
+        )
+        return db.session.execute(stmt).all()
+    
+    @staticmethod
+    def rebuild_scores(clinic_id=None):
+        """
+        Recompute scores from prescription history: each test on a
+        prescription counts at its date. Returns rows updated. Caller commits.
+        """
+        tests = db.select(Prescription.clinic_id, Prescription.diagnostic_tests, Prescription.created_at).where(
+            Prescription.diagnostic_tests.isnot(None)
+        )
+        if clinic_id is not None:
+            tests = tests.where(Prescription.clinic_id == clinic_id)
+        history = {}
+        for cid, text, when in db.session.execute(tests.execution_options(yield_per=1000)):
+            for name in set(diagnostic_test_names(text)):
+                score, count = history.get((cid, name), (0.0, 0))
+                history[(cid, name)] = (score + usage_score(when), count + 1)
+        return _apply_library_scores(DiagnosticTestMaster, history, clinic_id)
 
 
+class MedicineDosingStat(db.Model):
+    """
+    How often each dosage/frequency/duration/timing value was prescribed
+    with a medicine, per clinic. Counts follow the saved medicine lines
+    (edits and deletes subtract), and the most used values become the
+    library's common_* defaults.
+    """
+    __tablename__ = 'medicine_dosing_stats'
+    
+    FIELDS = ('dosage', 'frequency', 'duration', 'timing')
+    OPTIONS = 3  # values per field kept in MedicineMaster.dosing_options
+    
+    clinic_id = db.Column(db.Integer, db.ForeignKey('clinics.id'), primary_key=True)
+    medicine = db.Column(db.String(200), primary_key=True)  # MedicineMaster.name
+    field = db.Column(db.String(20), primary_key=True)  # dosage, frequency, duration, timing
+    value = db.Column(db.String(100), primary_key=True)
+    uses = db.Column(db.Integer, nullable=False, default=0)
+    
+    @staticmethod
+    def _counts(lines, step, counts):
+        for line in lines:
+            name = (line.get('name') or '').strip()
+            if not name:
+                continue
+            for field in MedicineDosingStat.FIELDS:
+                value = (line.get(field) or '').strip()[:100]
+                if value:
+                    key = (name, field, value)
+                    counts[key] = counts.get(key, 0) + step
+        return counts
+    
+    @staticmethod
+    def record(clinic_id, added, removed=()):
+        """
+        Count the values on `added` medicine lines and uncount `removed` ones
+        in one upsert. Returns the medicine names touched. Caller commits.
+        """
+        counts = MedicineDosingStat._counts(added, 1, {})
+        MedicineDosingStat._counts(removed, -1, counts)
+        rows = [
+            {'clinic_id': clinic_id, 'medicine': name, 'field': field, 'value': value, 'uses': uses}
+            for (name, field, value), uses in counts.items() if uses
+        ]
+        if rows:
+            stmt = upsert_insert(MedicineDosingStat).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['clinic_id', 'medicine', 'field', 'value'],
+                set_={'uses': MedicineDosingStat.uses + stmt.excluded.uses}
+            )
+            db.session.execute(stmt)
+        return {name for name, _, _ in counts}
+    
+    @staticmethod
+    def refresh_library(clinic_id, names=None):
+        """
+        Set common_* (most used value) and dosing_options (top values per
+        field) on the clinic's library entries for `names` (None = all) from
+        the counters. Returns {name: updated payload fields}. Caller commits.
+        """
+        query = db.session.query(
+            MedicineDosingStat.medicine, MedicineDosingStat.field,
+            MedicineDosingStat.value, MedicineDosingStat.uses
+        ).filter(MedicineDosingStat.clinic_id == clinic_id, MedicineDosingStat.uses > 0)
+        if names is not None:
+            if not names:
+                return {}
+            query = query.filter(MedicineDosingStat.medicine.in_(names))
+        
+        options = {name: {} for name in names or ()}
+        for name, field, value, uses in query.order_by(MedicineDosingStat.uses.desc(), MedicineDosingStat.value):
+            values = options.setdefault(name, {}).setdefault(field, [])
+            if len(values) < MedicineDosingStat.OPTIONS:
+                values.append({'value': value, 'uses': uses})
+        
+        payloads = {}
+        for name, fields in options.items():
+            payloads[name] = {f'common_{field}': fields[field][0]['value'] if field in fields else None
+                              for field in MedicineDosingStat.FIELDS}
+            payloads[name]['dosing_options'] = fields
+        if payloads:
+            # Core UPDATE on the table: executemany with a WHERE per name
+            table = MedicineMaster.__table__
+            stmt = db.update(table).where(
+                table.c.clinic_id == clinic_id,
+                table.c.name == db.bindparam('medicine_name')
+            ).values(
+                dosing_options=db.bindparam('new_options'),
+                **{f'common_{field}': db.bindparam(f'new_{field}') for field in MedicineDosingStat.FIELDS}
+            )
+            db.session.execute(stmt, [
+                dict({f'new_{field}': payload[f'common_{field}'] for field in MedicineDosingStat.FIELDS},
+                     medicine_name=name, new_options=json.dumps(payload['dosing_options']))
+                for name, payload in payloads.items()
+            ])
+        return payloads
+    
+    @staticmethod
+    def rebuild(clinic_id=None):
+        """
+        Recount from every saved medicine line (all clinics, or just one)
+        and refresh the library defaults. Returns the number of counter rows.
+        Caller commits.
+        """
+        query = db.select(Prescription.clinic_id, Medicine.name, *[getattr(Medicine, f) for f in MedicineDosingStat.FIELDS]).join(
+            Prescription, Prescription.id == Medicine.prescription_id
+        )
+        if clinic_id is not None:
+            query = query.where(Prescription.clinic_id == clinic_id)
+        counts = {}
+        for row in db.session.execute(query.execution_options(yield_per=1000)):
+            counts.setdefault(row.clinic_id, {})
+            MedicineDosingStat._counts([row._mapping], 1, counts[row.clinic_id])
+        
+        delete = MedicineDosingStat.query
+        if clinic_id is not None:
+            delete = delete.filter_by(clinic_id=clinic_id)
+        delete.delete(synchronize_session=False)
+        rows = [
+            {'clinic_id': cid, 'medicine': name, 'field': field, 'value': value, 'uses': uses}
+            for cid, clinic_counts in counts.items() for (name, field, value), uses in clinic_counts.items()
+        ]
+        if rows:
+            db.session.execute(db.insert(MedicineDosingStat), rows)
+        
+        clinics = db.session.query(MedicineMaster.clinic_id).distinct()
+        if clinic_id is not None:
+            clinics = clinics.filter(MedicineMaster.clinic_id == clinic_id)
+        for (cid,) in clinics.all():
+            MedicineDosingStat.refresh_library(cid)
+        return len(rows)
+
+
+class IdSequence(db.Model):
+    """Per-clinic counters for human-readable IDs (PAT-0001, RX-0001)"""
+    __tablename__ = 'id_sequences'
+    
+    clinic_id = db.Column(db.Integer, db.ForeignKey('clinics.id'), primary_key=True)
+    name = db.Column(db.String(30), primary_key=True)  # patient, prescription
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+    
+    @staticmethod
+    def allocate(clinic_id, name, count, prefix, column):
+        """
+        Atomically reserve `count` consecutive numbers and return the first.
+        The counter row stays locked until the caller commits, so concurrent
+        workers never hand out the same number. On first use the counter is
+        seeded once from the highest existing `prefix`NNNN value in `column`.
+        """
+        stmt = db.update(IdSequence).where(
+            IdSequence.clinic_id == clinic_id,
+            IdSequence.name == name
+        ).values(last_value=IdSequence.last_value + count).returning(IdSequence.last_value)
+        last = db.session.execute(stmt).scalar()
+        
+        if last is None:
+            # First allocation for this clinic: seed from existing IDs
+            max_num = 0
+            existing = db.session.query(column).filter(
+                column.class_.clinic_id == clinic_id,
+                column.like(f'{prefix}%')
+            )
+            for (value,) in existing:
+                suffix = value[len(prefix):]
+                if suffix.isdigit():
+                    max_num = max(max_num, int(suffix))
+            
+            # Another worker may seed concurrently; the conflict branch handles it
+            stmt = upsert_insert(IdSequence).values(
+                clinic_id=clinic_id, name=name, last_value=max_num + count
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['clinic_id', 'name'],
+                set_={'last_value': IdSequence.last_value + count}
+            ).returning(IdSequence.last_value)
+            last = db.session.execute(stmt).scalar_one()
+        
+        return last - count + 1
+
+
+class DailyClinicStats(db.Model):
+    """Per-clinic daily rollup for the dashboard, updated in the same transaction as each write"""
+    __tablename__ = 'daily_clinic_stats'
+    
+    clinic_id = db.Column(db.Integer, db.ForeignKey('clinics.id'), primary_key=True)
+    stat_date = db.Column(db.Date, primary_key=True)
+    
+    consultations = db.Column(db.Integer, nullable=False, default=0)
+    collection = db.Column(db.Float, nullable=False, default=0)  # Sum of consultation total_amount
+    new_patients = db.Column(db.Integer, nullable=False, default=0)
+    patients_total = db.Column(db.Integer, nullable=False, default=0)  # Registered patients as of end of day
+    
+    @staticmethod
+    def record(clinic_id, stat_date, consultations=0, collection=0, new_patients=0):
+        """
+        Add deltas to a clinic's row for `stat_date` (created if missing,
+        carrying patients_total forward from the previous row). Caller commits.
+        """
+        previous_total = db.select(DailyClinicStats.patients_total).where(
+            DailyClinicStats.clinic_id == clinic_id,
+            DailyClinicStats.stat_date < stat_date
+        ).order_by(DailyClinicStats.stat_date.desc()).limit(1).scalar_subquery()
+        
+        stmt = upsert_insert(DailyClinicStats).values(
+            clinic_id=clinic_id,
+            stat_date=stat_date,
+            consultations=consultations,
+            collection=collection or 0,
+            new_patients=new_patients,
+            patients_total=db.func.coalesce(previous_total, 0) + new_patients
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['clinic_id', 'stat_date'],
+            set_={
+                'consultations': DailyClinicStats.consultations + stmt.excluded.consultations,
+                'collection': DailyClinicStats.collection + stmt.excluded.collection,
+                'new_patients': DailyClinicStats.new_patients + stmt.excluded.new_patients,
+                'patients_total': DailyClinicStats.patients_total + stmt.excluded.new_patients,
+            }
+        )
+        db.session.execute(stmt)
+    
+    @staticmethod
+    def latest(clinic_id, stat_date):
+        """Most recent row on or before `stat_date` (None if the clinic has no rows)"""
+        return DailyClinicStats.query.filter(
+            DailyClinicStats.clinic_id == clinic_id,
+            DailyClinicStats.stat_date <= stat_date
+        ).order_by(DailyClinicStats.stat_date.desc()).first()
+    
+    @staticmethod
+    def rebuild(clinic_id=None):
+        """
+        Recompute the rollup from consultation and patient history
+        (all clinics, or just one). Returns the number of rows written. Caller commits.
+        """
+        def as_date(value):
+            # date() comes back as a string on SQLite
+            return date.fromisoformat(value) if isinstance(value, str) else value
+        
+        days = {}
+        def row(cid, day):
+            return days.setdefault((cid, as_date(day)), {
+                'clinic_id': cid, 'stat_date': as_date(day),
+                'consultations': 0, 'collection': 0, 'new_patients': 0, 'patients_total': 0
+            })
+        
+        consultation_day = db.func.date(Consultation.consultation_date)
+        query = db.session.query(
+            Consultation.clinic_id, consultation_day,
+            db.func.count(Consultation.id), db.func.sum(Consultation.total_amount)
+        ).filter(Consultation.consultation_date.isnot(None)).group_by(Consultation.clinic_id, consultation_day)
+        if clinic_id is not None:
+            query = query.filter(Consultation.clinic_id == clinic_id)
+        for cid, day, count, total in query:
+            entry = row(cid, day)
+            entry['consultations'] = count
+            entry['collection'] = total or 0
+        
+        registration_day = db.func.date(Patient.registration_date)
+        query = db.session.query(
+            Patient.clinic_id, registration_day, db.func.count(Patient.id)
+        ).filter(Patient.registration_date.isnot(None)).group_by(Patient.clinic_id, registration_day)
+        if clinic_id is not None:
+            query = query.filter(Patient.clinic_id == clinic_id)
+        for cid, day, count in query:
+            row(cid, day)['new_patients'] = count
+        
+        # Running patient totals per clinic
+        rows = sorted(days.values(), key=lambda r: (r['clinic_id'], r['stat_date']))
+        running = {}
+        for entry in rows:
+            running[entry['clinic_id']] = running.get(entry['clinic_id'], 0) + entry['new_patients']
+            entry['patients_total'] = running[entry['clinic_id']]
+        
+        delete = DailyClinicStats.query
+        if clinic_id is not None:
+            delete = delete.filter_by(clinic_id=clinic_id)
+        delete.delete(synchronize_session=False)
+        if rows:
+            db.session.execute(db.insert(DailyClinicStats), rows)
+        return len(rows)
+
+
+class Job(db.Model):
+    """Durable background job (see jobs.py); run_at doubles as the retry backoff"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # handler name, e.g. sms_reminder
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    dedupe_key = db.Column(db.String(200), unique=True)  # enqueueing the same key twice is a no-op
+    
+    # State
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    # Claim scans pending jobs that are due
+    __table_args__ = (
+        db.Index('idx_jobs_status_run_at', 'status', 'run_at'),
+    )
+    
+    @staticmethod
+    def enqueue(kind, payload, run_at=None, dedupe_key=None, max_attempts=5):
+        """Add a job unless one with the same dedupe_key exists. Caller commits."""
+        stmt = upsert_insert(Job).values(
+            kind=kind,
+            payload=json.dumps(payload),
+            dedupe_key=dedupe_key,
+            status='pending',
+            attempts=0,
+            max_attempts=max_attempts,
+            run_at=run_at or datetime.utcnow(),
+            created_at=datetime.utcnow()
+        )
+        db.session.execute(stmt.on_conflict_do_nothing(index_elements=['dedupe_key']))
+    
+    @staticmethod
+    def claim(worker, limit, stale_after):
+        """
+        Atomically mark up to `limit` due jobs as running for `worker` and
+        return them. Jobs left running longer than `stale_after` (a crashed
+        worker) are claimable again. Concurrent workers skip each other's
+        rows (SKIP LOCKED on PostgreSQL; SQLite serializes writers). Caller commits.
+        """
+        now = datetime.utcnow()
+        due = db.select(Job.id).where(db.or_(
+            db.and_(Job.status == 'pending', Job.run_at <= now),
+            db.and_(Job.status == 'running', Job.locked_at < now - stale_after)
+        )).order_by(Job.run_at).limit(limit).with_for_update(skip_locked=True)
+        
+        stmt = db.update(Job).where(Job.id.in_(due.scalar_subquery())).values(
+            status='running', locked_by=worker, locked_at=now, attempts=Job.attempts + 1
+        ).returning(Job.id)
+        ids = db.session.execute(stmt).scalars().all()
+        if not ids:
+            return []
+        return Job.query.filter(Job.id.in_(ids)).order_by(Job.run_at, Job.id).populate_existing().all()
+
+
+class SchemaVersion(db.Model):
+    """Single-row marker of the schema version the database was last brought up to"""
+    __tablename__ = 'schema_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @staticmethod
+    def mark(version):
+        """Record `version` as applied. Caller commits."""
+        marker = db.session.get(SchemaVersion, 1)
+        if marker:
+            marker.version = version
+        else:
+            db.session.add(SchemaVersion(id=1, version=version))
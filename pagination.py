@@ -0,0 +1,100 @@
+"""
+Keyset (cursor) pagination helpers
+Pages are fetched with WHERE (sort keys) < cursor instead of OFFSET,
+so every page costs the same no matter how deep or how broad the search
+"""
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime
+import json
+from models import db
+
+DEFAULT_PER_PAGE = 100
+MAX_PER_PAGE = 200
+
+
+def _encode_value(value):
+    return {'$dt': value.isoformat()} if isinstance(value, datetime) else value
+
+
+def _decode_value(value):
+    return datetime.fromisoformat(value['$dt']) if isinstance(value, dict) else value
+
+
+def encode_cursor(values):
+    """Opaque cursor for a position given as a list of sort-key values"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Inverse of encode_cursor; returns None for missing or malformed cursors"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != size:
+            return None
+        return [_decode_value(v) for v in values]
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def get_per_page(value):
+    """Clamp the requested page size"""
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PER_PAGE
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+class Page:
+    """One page of results plus cursors to its neighbours"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def _past(keys, values, older):
+    """WHERE clause for rows strictly after `values` in (keys) DESC order"""
+    clauses = []
+    for i, (expr, _) in enumerate(keys):
+        equal = [k == v for (k, _), v in zip(keys[:i], values[:i])]
+        clauses.append(db.and_(*equal, expr < values[i] if older else expr > values[i]))
+    return db.or_(*clauses)
+
+
+def keyset_paginate(query, keys, per_page, after=None, before=None):
+    """
+    Page of `query` ordered by `keys` DESC. Each key is a mapped column
+    (e.g. Patient.id) or an (expression, attribute name) pair for values
+    loaded with with_expression(); the last key must be unique.
+    `after` continues to older rows (next page), `before` walks back to
+    newer rows (previous page). Fetches per_page + 1 rows to know whether
+    another page exists.
+    """
+    keys = [key if isinstance(key, tuple) else (key, key.key) for key in keys]
+    after, before = decode_cursor(after, len(keys)), decode_cursor(before, len(keys))
+    backwards = before is not None and after is None
+    position = before if backwards else after
+
+    if position:
+        query = query.filter(_past(keys, position, older=not backwards))
+
+    if backwards:
+        rows = query.order_by(*[expr.asc() for expr, _ in keys]).limit(per_page + 1).all()
+        items = list(reversed(rows[:per_page]))
+        has_newer, has_older = len(rows) > per_page, True
+    else:
+        rows = query.order_by(*[expr.desc() for expr, _ in keys]).limit(per_page + 1).all()
+        items = rows[:per_page]
+        has_newer, has_older = position is not None, len(rows) > per_page
+
+    cursor = lambda item: encode_cursor([getattr(item, attr) for _, attr in keys])
+    return Page(
+        items,
+        next_cursor=cursor(items[-1]) if items and has_older else None,
+        prev_cursor=cursor(items[0]) if items and has_newer else None
+    )
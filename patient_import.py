@@ -0,0 +1,226 @@
+"""
+Bulk patient import from CSV
+Streams the file row by row, so memory stays flat however large it is:
+rows are validated and normalized as they are read, patient IDs are
+allocated one block per batch, and each batch goes in as a single
+executemany INSERT. Bad rows are reported by line number and skipped;
+they never abort the rest of the batch.
+"""
+import csv
+import re
+from datetime import datetime
+from sqlalchemy.exc import DBAPIError
+from models import db, Patient, DailyClinicStats
+
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 200  # further errors are only counted
+
+# Accepted header spellings (compared lower-cased, spaces/dashes as underscores)
+COLUMN_ALIASES = {
+    'name': ('name', 'patient_name', 'full_name'),
+    'phone': ('phone', 'mobile', 'phone_number', 'contact', 'contact_number'),
+    'age': ('age',),
+    'gender': ('gender', 'sex'),
+    'date_of_birth': ('date_of_birth', 'dob', 'birth_date'),
+    'blood_group': ('blood_group', 'blood_type'),
+    'email': ('email', 'email_address'),
+    'address': ('address',),
+    'allergies': ('allergies',),
+    'chronic_conditions': ('chronic_conditions', 'conditions', 'medical_history'),
+    'emergency_contact': ('emergency_contact', 'emergency_contact_name'),
+    'emergency_phone': ('emergency_phone', 'emergency_contact_phone'),
+    'registration_date': ('registration_date', 'registered', 'registered_on', 'created_at'),
+}
+GENDERS = {'m': 'Male', 'male': 'Male', 'f': 'Female', 'female': 'Female', 'o': 'Other', 'other': 'Other'}
+BLOOD_GROUPS = {'A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-'}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y')
+PHONE_RE = re.compile(r'^\+?\d{6,15}$')
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class ImportResult:
+    """Counts and (capped) per-row errors for one import run"""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = []  # (line number, message)
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'batches': self.batches,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors]
+        }
+
+
+def _parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized date {value!r} (use YYYY-MM-DD or DD/MM/YYYY)")
+
+
+def _column_map(fieldnames):
+    """Map CSV headers to Patient fields; raises ValueError if required ones are missing"""
+    lookup = {}
+    for header in fieldnames or []:
+        key = re.sub(r'[\s\-]+', '_', (header or '').strip().lower())
+        for field, aliases in COLUMN_ALIASES.items():
+            if key in aliases and field not in lookup.values():
+                lookup[header] = field
+    missing = [field for field in ('name', 'phone') if field not in lookup.values()]
+    if missing:
+        raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+    return lookup
+
+
+def _limit(value, column, field):
+    length = getattr(column.type, 'length', None)
+    if length and len(value) > length:
+        raise ValueError(f"{field} longer than {length} characters")
+    return value
+
+
+def normalize_row(raw, columns, today):
+    """Validate one CSV row and return Patient column values (raises ValueError)"""
+    values = {}
+    for header, field in columns.items():
+        value = (raw.get(header) or '').strip()
+        if value:
+            values[field] = value
+
+    if 'name' not in values:
+        raise ValueError('name is required')
+    values['name'] = _limit(' '.join(values['name'].split()), Patient.name, 'name')
+
+    phone = re.sub(r'[\s\-().]', '', values.get('phone', ''))
+    if not PHONE_RE.match(phone):
+        raise ValueError(f"invalid phone {values.get('phone', '')!r}")
+    values['phone'] = phone
+
+    if 'emergency_phone' in values:
+        values['emergency_phone'] = _limit(re.sub(r'[\s\-().]', '', values['emergency_phone']),
+                                           Patient.emergency_phone, 'emergency_phone')
+
+    if 'date_of_birth' in values:
+        dob = _parse_date(values['date_of_birth']).date()
+        if dob > today:
+            raise ValueError('date_of_birth is in the future')
+        values['date_of_birth'] = dob
+
+    if 'age' in values:
+        try:
+            age = int(float(values['age']))
+        except ValueError:
+            raise ValueError(f"invalid age {values['age']!r}")
+        if not 0 <= age <= 150:
+            raise ValueError(f"age {age} out of range")
+        values['age'] = age
+    elif 'date_of_birth' in values:
+        dob = values['date_of_birth']
+        values['age'] = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+    if 'gender' in values:
+        gender = GENDERS.get(values['gender'].lower())
+        if not gender:
+            raise ValueError(f"invalid gender {values['gender']!r}")
+        values['gender'] = gender
+
+    if 'blood_group' in values:
+        group = values['blood_group'].upper().replace(' ', '')
+        if group.endswith('VE'):
+            group = group[:-2]  # A+ve, O-ve
+        if group not in BLOOD_GROUPS:
+            raise ValueError(f"invalid blood group {values['blood_group']!r}")
+        values['blood_group'] = group
+
+    if 'email' in values:
+        if not EMAIL_RE.match(values['email']):
+            raise ValueError(f"invalid email {values['email']!r}")
+        values['email'] = _limit(values['email'].lower(), Patient.email, 'email')
+
+    if 'emergency_contact' in values:
+        values['emergency_contact'] = _limit(values['emergency_contact'], Patient.emergency_contact, 'emergency_contact')
+
+    if 'registration_date' in values:
+        values['registration_date'] = _parse_date(values['registration_date'][:10])
+    return values
+
+
+def _insert_batch(clinic_id, batch, result, now):
+    """Insert one batch of (line, values); falls back to row-by-row on a database error"""
+    patient_ids = Patient.generate_patient_ids(clinic_id, len(batch))
+    rows = []
+    for patient_id, (line, values) in zip(patient_ids, batch):
+        # executemany needs the same keys in every row
+        row = dict.fromkeys(COLUMN_ALIASES)
+        row.update(values, clinic_id=clinic_id, patient_id=patient_id)
+        row['registration_date'] = values.get('registration_date', now)
+        rows.append(row)
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.insert(Patient), rows)
+        inserted = rows
+    except DBAPIError:
+        # Isolate the offending rows; their allocated IDs are left unused
+        inserted = []
+        for row, (line, values) in zip(rows, batch):
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(db.insert(Patient), [row])
+                inserted.append(row)
+            except DBAPIError as e:
+                result.add_error(line, str(e.orig).splitlines()[0])
+
+    registered_today = sum(1 for row in inserted if row['registration_date'].date() == now.date())
+    if registered_today:
+        DailyClinicStats.record(clinic_id, now.date(), new_patients=registered_today)
+    db.session.commit()
+    result.imported += len(inserted)
+    result.batches += 1
+    return len(inserted) - registered_today  # backdated registrations
+
+
+def import_patients(clinic_id, stream, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import patients from a text stream of CSV. Commits after every batch, so
+    a failure part-way keeps the batches already written. Returns an ImportResult.
+    """
+    reader = csv.DictReader(stream)
+    columns = _column_map(reader.fieldnames)
+    result = ImportResult()
+    now = datetime.utcnow()
+    today = now.date()
+    backdated = 0
+
+    batch = []
+    for raw in reader:
+        line = reader.line_num
+        if not any((value or '').strip() for value in raw.values() if isinstance(value, str)):
+            continue  # blank line
+        try:
+            batch.append((line, normalize_row(raw, columns, today)))
+        except ValueError as e:
+            result.add_error(line, str(e))
+            continue
+        if len(batch) >= batch_size:
+            backdated += _insert_batch(clinic_id, batch, result, now)
+            batch = []
+    if batch:
+        backdated += _insert_batch(clinic_id, batch, result, now)
+
+    if backdated:
+        # Past registration dates change history the rollup already summed
+        DailyClinicStats.rebuild(clinic_id)
+        db.session.commit()
+    return result
@@ -0,0 +1,180 @@
+"""
+Patient search backends
+Indexed substring search for the front desk: pg_trgm GIN indexes on
+PostgreSQL, an FTS5 trigram shadow table on SQLite. Every match carries
+a rank so exact phone/ID hits come first, then name prefixes, then the rest.
+Typeahead lookups shorter than a trigram use the btree prefix indexes.
+"""
+from sqlalchemy.exc import OperationalError
+from models import db, Patient
+
+# Match quality, best first (loaded into Patient.search_rank)
+RANK_EXACT = 3      # phone or patient ID equals the search term
+RANK_PREFIX = 2     # name starts with the term
+RANK_CONTAINS = 1   # term appears in name, phone or patient ID
+RANK_FUZZY = 0      # similar name (PostgreSQL trigram similarity only)
+
+
+def _like_pattern(term, prefix_only=False):
+    """LIKE pattern with the user's % and _ escaped"""
+    escaped = term.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'{escaped}%' if prefix_only else f'%{escaped}%'
+
+
+def _contains(term):
+    pattern = _like_pattern(term)
+    return db.or_(
+        db.func.lower(Patient.name).like(pattern, escape='\\'),
+        db.func.lower(Patient.phone).like(pattern, escape='\\'),
+        db.func.lower(Patient.patient_id).like(pattern, escape='\\')
+    )
+
+
+def match_rank(term):
+    """SQL expression scoring how well a patient row matches `term`"""
+    return db.case(
+        (db.or_(Patient.phone == term, db.func.lower(Patient.patient_id) == term.lower()), RANK_EXACT),
+        (db.func.lower(Patient.name).like(_like_pattern(term, prefix_only=True), escape='\\'), RANK_PREFIX),
+        (_contains(term), RANK_CONTAINS),
+        else_=RANK_FUZZY
+    )
+
+
+class PatientSearch:
+    """Plain LIKE search; the fallback when no index-backed backend applies"""
+
+    def setup(self):
+        """Create whatever index structures the backend needs"""
+
+    def candidates(self, term):
+        """Filter selecting the rows that match `term`"""
+        return _contains(term)
+
+    def search(self, query, term):
+        """
+        Restrict a Patient query to matches for `term` and load their rank.
+        Returns (query, sort keys) ready for keyset_paginate().
+        """
+        rank = match_rank(term)
+        query = query.filter(self.candidates(term)).options(db.with_expression(Patient.search_rank, rank))
+        return query, [(rank, 'search_rank'), Patient.registration_date, Patient.id]
+
+    def starts_with(self, expr, prefix):
+        """`expr` LIKE 'prefix%' (index-backed with text_pattern_ops on PostgreSQL)"""
+        return expr.like(_like_pattern(prefix, prefix_only=True), escape='\\')
+
+    def prefix(self, clinic_id, term):
+        """
+        Name, phone or patient ID starts with `term` (idx_patients_*_prefix).
+        clinic_id is repeated in each branch so SQLite can plan a multi-index OR.
+        """
+        lowered = term.lower()
+        return db.or_(*[
+            db.and_(Patient.clinic_id == clinic_id, self.starts_with(expr, lowered))
+            for expr in (db.func.lower(Patient.name), Patient.phone, db.func.lower(Patient.patient_id))
+        ])
+
+    def typeahead(self, clinic_id, term, limit=10):
+        """Best `limit` matches for a typeahead: prefix matches for short terms, ranked search otherwise"""
+        rank = match_rank(term)
+        if len(term) < 3:
+            matches = [self.prefix(clinic_id, term)]  # carries clinic_id per branch
+        else:
+            matches = [Patient.clinic_id == clinic_id, self.candidates(term)]
+        return Patient.query.filter(*matches).options(
+            db.with_expression(Patient.search_rank, rank)
+        ).order_by(rank.desc(), Patient.name, Patient.id).limit(limit).all()
+
+
+class SQLitePatientSearch(PatientSearch):
+    """FTS5 trigram shadow table over name/phone/patient_id, kept in sync by triggers"""
+
+    def setup(self):
+        exists = db.session.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patients_fts'"
+        )).first()
+        statements = [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5("
+            "name, phone, patient_id, content='patients', content_rowid='id', tokenize='trigram')",
+            "CREATE TRIGGER IF NOT EXISTS patients_fts_ai AFTER INSERT ON patients BEGIN "
+            "INSERT INTO patients_fts(rowid, name, phone, patient_id) "
+            "VALUES (new.id, new.name, new.phone, new.patient_id); END",
+            "CREATE TRIGGER IF NOT EXISTS patients_fts_ad AFTER DELETE ON patients BEGIN "
+            "INSERT INTO patients_fts(patients_fts, rowid, name, phone, patient_id) "
+            "VALUES ('delete', old.id, old.name, old.phone, old.patient_id); END",
+            "CREATE TRIGGER IF NOT EXISTS patients_fts_au AFTER UPDATE OF name, phone, patient_id ON patients BEGIN "
+            "INSERT INTO patients_fts(patients_fts, rowid, name, phone, patient_id) "
+            "VALUES ('delete', old.id, old.name, old.phone, old.patient_id); "
+            "INSERT INTO patients_fts(rowid, name, phone, patient_id) "
+            "VALUES (new.id, new.name, new.phone, new.patient_id); END",
+        ]
+        for statement in statements:
+            db.session.execute(db.text(statement))
+        if not exists:
+            # Index patients registered before the shadow table existed
+            db.session.execute(db.text("INSERT INTO patients_fts(patients_fts) VALUES ('rebuild')"))
+        db.session.commit()
+
+    def starts_with(self, expr, prefix):
+        # SQLite only uses an index for LIKE on plain NOCASE columns; a range
+        # on the same expression uses the idx_patients_*_prefix indexes
+        if not prefix:
+            return db.true()
+        return db.and_(expr >= prefix, expr < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+    def candidates(self, term):
+        if len(term) < 3:
+            return _contains(term)  # trigram index needs at least 3 characters
+        phrase = '"' + term.replace('"', '""') + '"'
+        matches = db.text(
+            "SELECT rowid FROM patients_fts WHERE patients_fts MATCH :fts_phrase"
+        ).bindparams(fts_phrase=phrase).columns(db.column('rowid'))
+        return Patient.id.in_(matches)
+
+
+class PostgresPatientSearch(PatientSearch):
+    """ILIKE and trigram similarity served by pg_trgm GIN indexes (migrations/add_patient_search.sql)"""
+
+    def __init__(self):
+        self.trigram = None
+
+    def setup(self):
+        self.trigram = db.session.execute(db.text(
+            "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+        )).first() is not None
+
+    def candidates(self, term):
+        if self.trigram is None:
+            self.setup()
+        if not self.trigram or len(term) < 3:
+            return _contains(term)
+        return db.or_(_contains(term), db.func.lower(Patient.name).op('%')(term.lower()))
+
+
+_backends = {}
+
+
+def patient_search():
+    """Search backend for the current app's database (created once per engine)"""
+    engine = db.engine
+    backend = _backends.get(engine.url)
+    if backend is None:
+        if engine.dialect.name == 'postgresql':
+            backend = PostgresPatientSearch()
+        elif engine.dialect.name == 'sqlite':
+            backend = SQLitePatientSearch()
+        else:
+            backend = PatientSearch()
+        _backends[engine.url] = backend
+    return backend
+
+
+def setup_patient_search():
+    """Create search index structures; falls back to LIKE if FTS5 is unavailable"""
+    backend = patient_search()
+    try:
+        backend.setup()
+    except OperationalError as e:
+        db.session.rollback()
+        print(f"⚠️ Patient search index unavailable, using LIKE search: {e}")
+        _backends[db.engine.url] = PatientSearch()
@@ -0,0 +1,114 @@
+"""
+Patient timeline
+Consultations, prescriptions and appointments for one patient merged into a
+single newest-first stream, one UNION ALL query per page. Each branch is
+cut to the page size on its own (patient_id + date index) before the
+merge, so a page costs the same however long the patient's history is.
+Pages continue from an opaque (time, kind, id) cursor.
+"""
+from models import db, Appointment, Consultation, Prescription
+from pagination import encode_cursor, decode_cursor
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def _appointment_at():
+    """Appointment date + HH:MM time as a timestamp (midnight for free-text times)"""
+    date_text = db.cast(Appointment.appointment_date, db.String)
+    on_grid = Appointment.appointment_time.like('__:__')
+    if db.session.get_bind().dialect.name == 'postgresql':
+        at = db.case(
+            (on_grid, db.cast(date_text + ' ' + Appointment.appointment_time, db.DateTime)),
+            else_=db.cast(Appointment.appointment_date, db.DateTime)
+        )
+    else:
+        # Same text format SQLAlchemy stores DateTime in, so comparisons line up
+        at = db.type_coerce(db.case(
+            (on_grid, db.func.datetime(date_text + ' ' + Appointment.appointment_time)),
+            else_=db.func.datetime(Appointment.appointment_date)
+        ), db.String) + '.000000'
+    return db.type_coerce(at, db.DateTime)
+
+
+def _no_vitals():
+    return [
+        db.cast(db.null(), db.Integer).label('bp_systolic'),
+        db.cast(db.null(), db.Integer).label('bp_diastolic'),
+        db.cast(db.null(), db.Integer).label('pulse'),
+        db.cast(db.null(), db.Float).label('temperature'),
+    ]
+
+
+def _branches():
+    """(kind, model, timestamp, shared columns) for each source"""
+    nothing = db.cast(db.null(), db.String)
+    return [
+        ('consultation', Consultation, Consultation.consultation_date, [
+            nothing.label('reference'),
+            db.func.coalesce(Consultation.diagnosis, Consultation.chief_complaint).label('summary'),
+            Consultation.payment_status.label('status'),
+            Consultation.total_amount.label('amount'),
+            Consultation.bp_systolic.label('bp_systolic'),
+            Consultation.bp_diastolic.label('bp_diastolic'),
+            Consultation.pulse.label('pulse'),
+            Consultation.temperature.label('temperature'),
+        ]),
+        ('prescription', Prescription, Prescription.created_at, [
+            Prescription.prescription_number.label('reference'),
+            Prescription.diagnosis.label('summary'),
+            nothing.label('status'),
+            db.cast(db.null(), db.Float).label('amount'),
+            *_no_vitals(),
+        ]),
+        # Completed appointments show up as their consultation
+        ('appointment', Appointment, _appointment_at(), [
+            Appointment.appointment_time.label('reference'),
+            Appointment.reason.label('summary'),
+            Appointment.status.label('status'),
+            db.cast(db.null(), db.Float).label('amount'),
+            *_no_vitals(),
+        ]),
+    ]
+
+
+def timeline_page(clinic_id, patient_id, after=None, limit=DEFAULT_LIMIT):
+    """
+    One page of the patient's timeline, newest first:
+    ([{'kind', 'id', 'at', 'reference', 'summary', 'status', 'amount',
+       'bp_systolic', 'bp_diastolic', 'pulse', 'temperature'}], next cursor or None)
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    position = decode_cursor(after, 3)
+
+    parts = []
+    for kind, model, at, columns in _branches():
+        branch = db.select(
+            db.literal(kind).label('kind'), model.id.label('id'), at.label('at'), *columns
+        ).where(model.clinic_id == clinic_id, model.patient_id == patient_id, at.isnot(None))
+        if model is Appointment:
+            branch = branch.where(Appointment.status != 'completed')
+        if position:
+            # Strictly after the cursor in (at, kind, id) DESC order
+            at_cursor, kind_cursor, id_cursor = position
+            if kind < kind_cursor:
+                branch = branch.where(at <= at_cursor)
+            elif kind == kind_cursor:
+                branch = branch.where(db.or_(at < at_cursor, db.and_(at == at_cursor, model.id < id_cursor)))
+            else:
+                branch = branch.where(at < at_cursor)
+        # Each branch only needs its own newest limit + 1 rows
+        branch = branch.order_by(at.desc(), model.id.desc()).limit(limit + 1)
+        parts.append(db.select(branch.subquery()))
+
+    merged = db.union_all(*parts).subquery()
+    rows = db.session.execute(
+        db.select(merged).order_by(merged.c.at.desc(), merged.c.kind.desc(), merged.c.id.desc()).limit(limit + 1)
+    ).all()
+
+    entries = [row._asdict() for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = entries[-1]
+        next_cursor = encode_cursor([last['at'], last['kind'], last['id']])
+    return entries, next_cursor
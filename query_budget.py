@@ -0,0 +1,45 @@
+"""
+Per-request SQL query budget
+Counts the statements each request runs so N+1 lazy loads get caught early
+"""
+from functools import wraps
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised (when enforcing) if a route runs more queries than it declared"""
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def query_count():
+    """Number of SQL statements run so far in the current request"""
+    return g.get('query_count', 0)
+
+
+def query_budget(max_queries):
+    """
+    Declare the most queries a view (including its template render) may run.
+    Raises QueryBudgetExceeded when QUERY_BUDGET_ENFORCE or TESTING is on,
+    otherwise logs a warning.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            start = query_count()
+            response = f(*args, **kwargs)
+            used = query_count() - start
+            if used > max_queries:
+                message = f'{request.endpoint} ran {used} queries (budget {max_queries})'
+                if current_app.config.get('QUERY_BUDGET_ENFORCE') or current_app.testing:
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(message)
+            return response
+        return decorated_function
+    return decorator
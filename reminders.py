@@ -0,0 +1,180 @@
+"""
+SMS reminders for appointments and follow-ups
+Booking an appointment or saving a follow-up date enqueues one job (deduped
+per source row and date) due the day before at REMINDER_SEND_AT clinic time.
+The worker sends due reminders per clinic in batches through the provider
+named by SMS_PROVIDER; the default stub only logs. Each job re-reads its
+source row first, so cancelled or moved appointments and cleared follow-ups
+are skipped rather than sent.
+"""
+import importlib
+from abc import ABC, abstractmethod
+from datetime import datetime, date, time, timedelta
+from flask import current_app
+from models import db, Clinic, Patient, Appointment, Consultation, Prescription, Job
+from jobs import job_handler
+
+JOB_KIND = 'sms_reminder'
+SOURCES = {'appointment': Appointment, 'consultation': Consultation, 'prescription': Prescription}
+
+APPOINTMENT_TEXT = 'Dear {patient}, reminder of your appointment with Dr. {doctor} at {clinic} on {date} at {time}.'
+FOLLOW_UP_TEXT = 'Dear {patient}, your follow-up visit with Dr. {doctor} at {clinic} is due on {date}.'
+
+
+class SMSProvider(ABC):
+    """Sends one clinic's messages; subclasses talk to a real gateway"""
+
+    @abstractmethod
+    def send_batch(self, clinic, messages):
+        """
+        Send [(phone, text)] using the clinic's sender ID/template. Returns a
+        list the same length as `messages`: None if sent, else an error string.
+        """
+
+
+class StubSMSProvider(SMSProvider):
+    """
+    Local/dev provider: prints messages instead of sending them. Refuses to
+    start outside testing, debug or a local SQLite database, so a deployment
+    without a gateway retries and then fails its reminders instead of
+    marking them sent.
+    """
+
+    def __init__(self):
+        app = current_app
+        if not (app.testing or app.debug or app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')):
+            raise RuntimeError('No SMS gateway configured: set SMS_PROVIDER to a real provider class')
+        self.sent = [] if app.testing else None  # only tests inspect what was sent
+
+    def send_batch(self, clinic, messages):
+        for phone, text in messages:
+            print(f"📱 [{clinic.sms_sender_id or 'STUB'}] {phone}: {text}")
+        if self.sent is not None:
+            self.sent.extend(messages)
+        return [None] * len(messages)
+
+
+_provider = None
+
+
+def get_provider():
+    """Instance of the SMS_PROVIDER class ('module:Class'), created once per process"""
+    global _provider
+    if _provider is None:
+        module_name, _, class_name = current_app.config.get('SMS_PROVIDER', 'reminders:StubSMSProvider').partition(':')
+        _provider = getattr(importlib.import_module(module_name), class_name)()
+    return _provider
+
+
+def send_time(day):
+    """UTC datetime to send a reminder for `day` (the day before, REMINDER_SEND_AT clinic time)"""
+    hours, minutes = current_app.config.get('REMINDER_SEND_AT', '10:00').split(':')
+    local = datetime.combine(day - timedelta(days=1), time(int(hours), int(minutes)))
+    return local - timedelta(minutes=current_app.config.get('REMINDER_TZ_OFFSET_MINUTES', 330))
+
+
+def schedule(clinic, source, record, day, at=None):
+    """
+    Enqueue a reminder for `record` on `day` if the clinic has SMS enabled
+    and the day hasn't passed. Re-scheduling the same row and date is a
+    no-op. Caller commits.
+    """
+    if not clinic or not clinic.sms_enabled or not day:
+        return
+    today = (datetime.utcnow() + timedelta(minutes=current_app.config.get('REMINDER_TZ_OFFSET_MINUTES', 330))).date()
+    if day < today:
+        return
+    key = f'{JOB_KIND}:{source}:{record.id}:{day.isoformat()}' + (f':{at}' if at else '')
+    payload = {'source': source, 'id': record.id, 'date': day.isoformat(), 'time': at}
+    Job.enqueue(JOB_KIND, payload, run_at=max(send_time(day), datetime.utcnow()), dedupe_key=key)
+
+
+def schedule_appointment(clinic, appointment):
+    schedule(clinic, 'appointment', appointment, appointment.appointment_date, appointment.appointment_time)
+
+
+def schedule_follow_up(clinic, record):
+    """Consultation or Prescription with a follow_up_date"""
+    schedule(clinic, record.__tablename__[:-1], record, record.follow_up_date)
+
+
+def _still_due(source, record, payload):
+    """The row still wants this reminder (not cancelled, moved or cleared)"""
+    if source == 'appointment':
+        return (record.status == 'scheduled'
+                and record.appointment_date.isoformat() == payload['date']
+                and record.appointment_time == payload['time'])
+    return record.follow_up_date is not None and record.follow_up_date.isoformat() == payload['date']
+
+
+def _message(source, record, patient, clinic):
+    values = {
+        'patient': patient.name, 'doctor': clinic.doctor_name, 'clinic': clinic.clinic_name,
+        'date': (record.appointment_date if source == 'appointment' else record.follow_up_date).strftime('%d-%b-%Y'),
+        'time': getattr(record, 'appointment_time', None)
+    }
+    return (APPOINTMENT_TEXT if source == 'appointment' else FOLLOW_UP_TEXT).format(**values)
+
+
+@job_handler(JOB_KIND)
+def send_reminders(jobs):
+    """
+    Batch handler: loads every source row with its patient and clinic in one
+    query per source type, then sends one provider batch per clinic.
+    """
+    ids_by_source = {}
+    for _, payload in jobs:
+        ids_by_source.setdefault(payload['source'], set()).add(payload['id'])
+
+    rows = {}
+    for source, ids in ids_by_source.items():
+        model = SOURCES[source]
+        # The patient must belong to the clinic the reminder is sent as
+        query = db.session.query(model, Patient, Clinic).join(
+            Patient, db.and_(Patient.id == model.patient_id, Patient.clinic_id == model.clinic_id)
+        ).join(Clinic, Clinic.id == model.clinic_id).filter(model.id.in_(ids))
+        for record, patient, clinic in query:
+            rows[(source, record.id)] = (record, patient, clinic)
+
+    batches = {}  # clinic id -> (clinic, [(job id, phone, text)])
+    for job_id, payload in jobs:
+        row = rows.get((payload['source'], payload['id']))
+        if row is None:
+            continue  # source row deleted
+        record, patient, clinic = row
+        if not clinic.sms_enabled or not patient.phone or not _still_due(payload['source'], record, payload):
+            continue
+        batches.setdefault(clinic.id, (clinic, []))[1].append(
+            (job_id, patient.phone, _message(payload['source'], record, patient, clinic))
+        )
+
+    errors = {}
+    provider = get_provider()
+    for clinic, messages in batches.values():
+        results = provider.send_batch(clinic, [(phone, text) for _, phone, text in messages])
+        for (job_id, _, _), error in zip(messages, results):
+            if error:
+                errors[job_id] = error
+    return errors
+
+
+def enqueue_upcoming(clinic_id=None):
+    """Enqueue reminders for every upcoming appointment and follow-up (idempotent). Returns rows seen."""
+    clinics = Clinic.query.filter(Clinic.sms_enabled.is_(True))
+    if clinic_id:
+        clinics = clinics.filter(Clinic.id == clinic_id)
+    today = date.today()
+    seen = 0
+    for clinic in clinics:
+        for appointment in Appointment.query.filter(
+            Appointment.clinic_id == clinic.id,
+            Appointment.appointment_date >= today,
+            Appointment.status == 'scheduled'
+        ):
+            schedule_appointment(clinic, appointment)
+            seen += 1
+        for model in (Consultation, Prescription):
+            for record in model.query.filter(model.clinic_id == clinic.id, model.follow_up_date >= today):
+                schedule_follow_up(clinic, record)
+                seen += 1
+    return seen
@@ -0,0 +1,146 @@
+"""
+Appointment slot engine
+Slots come from the clinic's working hours and consultation duration.
+Existing bookings for a date range are read in one query (served by
+idx_appointments_clinic_date) into a per-day interval index, so a week of
+availability is one round trip plus in-memory bisects. Bookings are
+checked for overlap atomically at insert time.
+"""
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from models import db, Clinic, Patient, Appointment
+
+MAX_DAYS = 31
+ACTIVE_STATUSES = ('scheduled', 'checked-in', 'completed')  # cancelled slots are free again
+
+
+class SlotUnavailable(ValueError):
+    """The requested time overlaps an existing appointment"""
+
+
+def parse_time(value):
+    """'HH:MM' -> minutes after midnight (raises ValueError)"""
+    hours, minutes = value.strip().split(':')[:2]
+    total = int(hours) * 60 + int(minutes)
+    if not 0 <= total < 24 * 60 or not 0 <= int(minutes) < 60:
+        raise ValueError(f'invalid time {value!r}')
+    return total
+
+
+def format_time(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def clinic_schedule(clinic):
+    """(opening minute, closing minute, slot length) with the model defaults as fallback"""
+    start = parse_time(clinic.working_hours_start or '09:00')
+    end = parse_time(clinic.working_hours_end or '18:00')
+    return start, end, max(5, clinic.consultation_duration or 15)
+
+
+class IntervalIndex:
+    """Booked start times per day; every booking lasts `duration` minutes"""
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.days = {}
+
+    def add(self, day, start):
+        self.days.setdefault(day, []).append(start)
+
+    def freeze(self):
+        for starts in self.days.values():
+            starts.sort()
+        return self
+
+    def overlaps(self, day, start):
+        """True if [start, start + duration) intersects a booking on `day`"""
+        starts = self.days.get(day)
+        if not starts:
+            return False
+        # A booking b overlaps iff start - duration < b < start + duration
+        i = bisect_right(starts, start - self.duration)
+        return i < len(starts) and starts[i] < start + self.duration
+
+
+def load_bookings(clinic_id, first_day, last_day, duration):
+    """IntervalIndex of active appointments between two dates (inclusive)"""
+    rows = db.session.query(Appointment.appointment_date, Appointment.appointment_time).filter(
+        Appointment.clinic_id == clinic_id,
+        Appointment.appointment_date >= first_day,
+        Appointment.appointment_date <= last_day,
+        Appointment.status.in_(ACTIVE_STATUSES)
+    )
+    index = IntervalIndex(duration)
+    for day, time_text in rows:
+        try:
+            index.add(day, parse_time(time_text))
+        except ValueError:
+            continue  # legacy free-text time; can't place it on the grid
+    return index.freeze()
+
+
+def available_slots(clinic, first_day, days, now=None):
+    """
+    Slot grid for `days` days from `first_day`:
+    [{'date', 'slots': [{'time', 'available'}], 'available'}]. Slots already
+    past (today) are marked unavailable.
+    """
+    now = now or datetime.now()
+    opening, closing, duration = clinic_schedule(clinic)
+    last_day = first_day + timedelta(days=days - 1)
+    bookings = load_bookings(clinic.id, first_day, last_day, duration)
+
+    result = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        cutoff = now.hour * 60 + now.minute if day == now.date() else -1
+        slots = []
+        for start in range(opening, closing - duration + 1, duration):
+            free = start > cutoff and day >= now.date() and not bookings.overlaps(day, start)
+            slots.append({'time': format_time(start), 'available': free})
+        result.append({
+            'date': day.isoformat(),
+            'slots': slots,
+            'available': sum(1 for slot in slots if slot['available'])
+        })
+    return result
+
+
+def book_slot(clinic_id, patient_id, day, time_text, reason=None):
+    """
+    Insert a scheduled appointment unless it overlaps an active one.
+    The clinic row is locked (PostgreSQL) and the overlap check is part of
+    the INSERT itself, so two concurrent bookings can't both take a slot.
+    The patient must belong to the clinic. Raises SlotUnavailable /
+    ValueError. Caller commits.
+    """
+    clinic = db.session.query(Clinic).filter_by(id=clinic_id).with_for_update().one()
+    _, _, duration = clinic_schedule(clinic)
+    start = parse_time(time_text)
+
+    # Zero-padded HH:MM sorts like time, so the overlap test is a string range
+    overlapping = db.select(Appointment.id).where(
+        Appointment.clinic_id == clinic_id,
+        Appointment.appointment_date == day,
+        Appointment.status.in_(ACTIVE_STATUSES),
+        Appointment.appointment_time > format_time(start - duration) if start >= duration else db.true(),
+        Appointment.appointment_time < format_time(start + duration)
+    )
+    row = {
+        'clinic_id': clinic_id, 'patient_id': patient_id, 'appointment_date': day,
+        'appointment_time': format_time(start), 'reason': reason, 'status': 'scheduled',
+        'created_at': datetime.utcnow()
+    }
+    own_patient = db.select(Patient.id).where(Patient.id == patient_id, Patient.clinic_id == clinic_id)
+    values = db.select(*[
+        db.literal(value, Appointment.__table__.c[name].type) for name, value in row.items()
+    ]).where(own_patient.exists(), ~overlapping.exists())
+    stmt = db.insert(Appointment).from_select(list(row), values).returning(Appointment.id)
+
+    appointment_id = db.session.execute(stmt).scalar()
+    if appointment_id is None:
+        if db.session.execute(own_patient).first() is None:
+            raise ValueError('Patient not found')
+        raise SlotUnavailable(f'{format_time(start)} on {day:%d-%b-%Y} is already booked')
+    return db.session.get(Appointment, appointment_id)